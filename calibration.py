@@ -0,0 +1,335 @@
+import argparse
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+from footballpredictions import DB_PATH, init_db
+
+
+# Probability calibration fitted per league on reconciled predictions, applied after ratings_to_probs.
+# Methods:
+#   temperature - multinomial temperature scaling with per-outcome biases: p ∝ exp(a·log p_k + b_k)
+#   dirichlet   - full Dirichlet calibration: p ∝ exp(W·log p + b), regularised towards the identity
+#   isotonic    - one isotonic (monotone step) curve per outcome, then renormalised
+# The logistic methods are fitted with Newton's method (a handful of iterations over numpy arrays); isotonic with
+# pool-adjacent-violators. A fitted model is a few numbers or knots, stored as JSON in the calibration table.
+
+METHODS = ("temperature", "dirichlet", "isotonic")
+DEFAULT_METHOD = "temperature"
+
+OUTCOMES = ("HOME", "DRAW", "AWAY")
+
+# Leagues with fewer reconciled predictions are left uncalibrated
+MIN_SAMPLES = 200
+
+# The most recent share of predictions is held out to check that the calibration helps before it is trusted
+HOLDOUT_SHARE = 0.2
+
+RELIABILITY_BINS = 10
+
+# Strength of the pull towards "no change"; larger values keep the calibration closer to the raw probabilities
+REGULARIZATION = 1e-3
+
+PROB_EPS = 1e-6
+
+
+def _log_probs(probs):
+    return np.log(np.clip(probs, PROB_EPS, 1.0))
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+# Design tensor X of shape (n, 3, P), so the logits are X @ theta, and the parameters of "no change".
+def _design(method, log_p):
+    n = len(log_p)
+    if method == "temperature":
+        # theta = (a, b_draw, b_away); the home bias is fixed at 0
+        X = np.zeros((n, 3, 3))
+        X[:, :, 0] = log_p
+        X[:, 1, 1] = 1
+        X[:, 2, 2] = 1
+        return X, np.array([1.0, 0.0, 0.0])
+
+    # dirichlet: the home logit is fixed at 0; theta = (W_draw (3), b_draw, W_away (3), b_away)
+    X = np.zeros((n, 3, 8))
+    X[:, 1, 0:3] = log_p
+    X[:, 1, 3] = 1
+    X[:, 2, 4:7] = log_p
+    X[:, 2, 7] = 1
+    return X, np.array([-1.0, 1.0, 0.0, 0.0, -1.0, 0.0, 1.0, 0.0])
+
+
+def _nll(X, y, theta, theta0, reg):
+    q = _softmax(np.einsum("nkp,p->nk", X, theta))
+    return -np.mean(np.log(np.sum(q * y, axis=1) + 1e-15)) + reg / 2 * np.sum((theta - theta0) ** 2)
+
+
+# Regularised multinomial logistic fit by Newton's method with step halving.
+def _fit_logistic(method, probs, y, max_iter=50, tol=1e-9):
+    X, theta0 = _design(method, _log_probs(probs))
+    reg = REGULARIZATION
+    n = len(y)
+    theta = theta0.copy()
+    loss = _nll(X, y, theta, theta0, reg)
+
+    for _ in range(max_iter):
+        q = _softmax(np.einsum("nkp,p->nk", X, theta))
+        grad = np.einsum("nkp,nk->p", X, q - y) / n + reg * (theta - theta0)
+        Xq = np.einsum("nkp,nk->np", X, q)
+        hess = (np.einsum("nkp,nk,nkr->pr", X, q, X) - Xq.T @ Xq) / n + reg * np.eye(len(theta))
+        step = np.linalg.solve(hess, grad)
+
+        t = 1.0
+        while t > 1e-4:
+            candidate = theta - t * step
+            new_loss = _nll(X, y, candidate, theta0, reg)
+            if new_loss <= loss:
+                break
+            t /= 2
+        else:
+            break
+        theta = candidate
+        if loss - new_loss < tol:
+            loss = new_loss
+            break
+        loss = new_loss
+
+    return {"method": method, "theta": [round(float(v), 6) for v in theta]}
+
+
+# Pool-adjacent-violators: the non-decreasing fit of y (ordered by x). Returns (block x means, block values).
+def _pav(x, y):
+    values, weights, xs = [], [], []
+    for xi, yi in zip(x, y):
+        values.append(float(yi))
+        weights.append(1.0)
+        xs.append(float(xi))
+        while len(values) > 1 and values[-2] > values[-1]:
+            w = weights[-2] + weights[-1]
+            values[-2] = (values[-2] * weights[-2] + values[-1] * weights[-1]) / w
+            xs[-2] = (xs[-2] * weights[-2] + xs[-1] * weights[-1]) / w
+            weights[-2] = w
+            del values[-1], weights[-1], xs[-1]
+    return xs, values
+
+
+def _fit_isotonic(probs, y):
+    knots = []
+    for k in range(3):
+        order = np.argsort(probs[:, k], kind="stable")
+        xs, values = _pav(probs[order, k], y[order, k])
+        knots.append([[round(v, 4) for v in xs], [round(v, 4) for v in values]])
+    return {"method": "isotonic", "knots": knots}
+
+
+def fit_calibration(probs, outcomes, method=DEFAULT_METHOD):
+    probs = np.asarray(probs, dtype=float)
+    y = np.zeros_like(probs)
+    y[np.arange(len(outcomes)), [OUTCOMES.index(o) for o in outcomes]] = 1
+    if method == "isotonic":
+        return _fit_isotonic(probs, y)
+    if method not in METHODS:
+        raise ValueError(f"Unknown calibration method {method!r}; expected one of {METHODS}")
+    return _fit_logistic(method, probs, y)
+
+
+# Applies a fitted model to arrays of probabilities (any shape, same for all three).
+# Returns calibrated (p_home, p_draw, p_away) arrays that sum to 1.
+def apply_calibration(model, p_home, p_draw, p_away):
+    probs = np.stack([np.asarray(p_home, dtype=float), np.asarray(p_draw, dtype=float),
+                      np.asarray(p_away, dtype=float)], axis=-1)
+    shape = probs.shape[:-1]
+    probs = probs.reshape(-1, 3)
+
+    if model["method"] == "isotonic":
+        cal = np.stack([np.interp(probs[:, k], *model["knots"][k]) for k in range(3)], axis=1)
+        cal = np.clip(cal, PROB_EPS, None)
+        cal = cal / cal.sum(axis=1, keepdims=True)
+    else:
+        X, _ = _design(model["method"], _log_probs(probs))
+        cal = _softmax(np.einsum("nkp,p->nk", X, np.asarray(model["theta"])))
+
+    cal = cal.reshape(shape + (3,))
+    return cal[..., 0], cal[..., 1], cal[..., 2]
+
+
+# Returns a calibration function for predict_match, taking and returning (p_home, p_draw, p_away).
+# Plain floats come back as floats, arrays (e.g. bootstrap resamples) as arrays.
+def calibration_fn(model):
+    def fn(p_home, p_draw, p_away):
+        cal = apply_calibration(model, p_home, p_draw, p_away)
+        if np.ndim(p_home) == 0:
+            return tuple(float(v) for v in cal)
+        return cal
+    return fn
+
+
+def _mean_log_loss(probs, outcomes):
+    idx = [OUTCOMES.index(o) for o in outcomes]
+    return float(-np.mean(np.log(np.clip(probs[np.arange(len(idx)), idx], 1e-15, None))))
+
+
+# Reliability curve per outcome: predictions are grouped into equal-width probability bins and each bin's mean
+# predicted probability is compared with how often the outcome happened. Also returns the expected calibration
+# error (bin-size-weighted mean gap) per outcome.
+def reliability_curve(probs, outcomes, bins=RELIABILITY_BINS):
+    probs = np.asarray(probs, dtype=float)
+    hits = np.array([[o == name for name in OUTCOMES] for o in outcomes], dtype=float)
+    curve = {}
+    for k, name in enumerate(OUTCOMES):
+        idx = np.minimum((probs[:, k] * bins).astype(int), bins - 1)
+        rows = []
+        ece = 0.0
+        for b in range(bins):
+            mask = idx == b
+            n = int(mask.sum())
+            if n == 0:
+                continue
+            predicted = float(probs[mask, k].mean())
+            observed = float(hits[mask, k].mean())
+            rows.append({"bin": [b / bins, (b + 1) / bins], "n": n, "predicted": predicted, "observed": observed})
+            ece += n * abs(predicted - observed)
+        curve[name] = {"bins": rows, "ece": ece / len(probs)}
+    return curve
+
+
+def _ensure_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS calibration
+                    (competition TEXT PRIMARY KEY, method TEXT, model TEXT, n INTEGER,
+                     log_loss_before REAL, log_loss_after REAL,
+                     holdout_log_loss_before REAL, holdout_log_loss_after REAL, fitted_at TEXT)''')
+
+
+# Reconciled predictions per competition, oldest first, as (probs array, outcomes list).
+# Rows saved with a calibration in place are read back at their raw (uncalibrated) probabilities.
+def load_training_data(conn, competition=None):
+    sql = '''SELECT competition, home_prob, draw_prob, away_prob, details, outcome FROM predictions
+             WHERE outcome IS NOT NULL'''
+    params = []
+    if competition is not None:
+        sql += " AND competition = ?"
+        params.append(competition)
+    data = {}
+    for comp, p_home, p_draw, p_away, details, outcome in conn.execute(sql + " ORDER BY date", params):
+        raw = json.loads(details).get("raw_probs") if details else None
+        if raw:
+            p_home, p_draw, p_away = raw["home"], raw["draw"], raw["away"]
+        probs, outcomes = data.setdefault(comp or "LEAGUE", ([], []))
+        probs.append((p_home, p_draw, p_away))
+        outcomes.append(outcome)
+    return {comp: (np.array(probs, dtype=float), outcomes) for comp, (probs, outcomes) in data.items()}
+
+
+# Fits and stores a calibration per competition. A league is skipped if it has fewer than MIN_SAMPLES
+# reconciled predictions or if calibration fitted on the older predictions makes the held-out recent ones worse.
+# Returns one summary dict per competition.
+def fit_and_store(conn, method=DEFAULT_METHOD, competition=None):
+    _ensure_table(conn)
+    summaries = []
+    for comp, (probs, outcomes) in load_training_data(conn, competition).items():
+        summary = {"competition": comp, "n": len(outcomes), "method": method, "stored": False}
+        summaries.append(summary)
+        if len(outcomes) < MIN_SAMPLES:
+            summary["reason"] = f"fewer than {MIN_SAMPLES} reconciled predictions"
+            continue
+
+        split = int(len(outcomes) * (1 - HOLDOUT_SHARE))
+        trial = fit_calibration(probs[:split], outcomes[:split], method)
+        held = np.stack(apply_calibration(trial, *probs[split:].T), axis=1)
+        holdout_before = _mean_log_loss(probs[split:], outcomes[split:])
+        holdout_after = _mean_log_loss(held, outcomes[split:])
+
+        model = fit_calibration(probs, outcomes, method)
+        calibrated = np.stack(apply_calibration(model, *probs.T), axis=1)
+        summary.update(log_loss_before=_mean_log_loss(probs, outcomes),
+                       log_loss_after=_mean_log_loss(calibrated, outcomes),
+                       holdout_log_loss_before=holdout_before, holdout_log_loss_after=holdout_after)
+        if holdout_after > holdout_before:
+            summary["reason"] = "no improvement on held-out recent predictions"
+            conn.execute("DELETE FROM calibration WHERE competition = ?", (comp,))
+            continue
+
+        conn.execute("INSERT OR REPLACE INTO calibration VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (comp, method, json.dumps(model), len(outcomes), summary["log_loss_before"],
+                      summary["log_loss_after"], holdout_before, holdout_after,
+                      datetime.now(timezone.utc).isoformat(timespec="seconds")))
+        summary["stored"] = True
+    conn.commit()
+    return summaries
+
+
+# Returns the stored model for a competition, or None if it has none.
+def load_calibration(conn, competition="LEAGUE"):
+    _ensure_table(conn)
+    row = conn.execute("SELECT model FROM calibration WHERE competition = ?", (competition,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+# Every stored model, as {competition: model}.
+def load_calibrations(conn):
+    _ensure_table(conn)
+    return {comp: json.loads(model) for comp, model in conn.execute("SELECT competition, model FROM calibration")}
+
+
+# Reliability curves per competition before and, where a calibration is stored, after applying it.
+def reliability_report(conn, competition=None, bins=RELIABILITY_BINS):
+    report = {}
+    for comp, (probs, outcomes) in load_training_data(conn, competition).items():
+        entry = {"n": len(outcomes), "raw": reliability_curve(probs, outcomes, bins)}
+        model = load_calibration(conn, comp)
+        if model is not None:
+            calibrated = np.stack(apply_calibration(model, *probs.T), axis=1)
+            entry["method"] = model["method"]
+            entry["calibrated"] = reliability_curve(calibrated, outcomes, bins)
+        report[comp] = entry
+    return report
+
+
+def print_report(report):
+    for comp, entry in report.items():
+        print(f"\n{comp} ({entry['n']} reconciled predictions)")
+        for name in OUTCOMES:
+            raw = entry["raw"][name]
+            line = f"  {name:<4} ECE raw {raw['ece']*100:.1f}%"
+            if "calibrated" in entry:
+                line += f" → {entry['method']} {entry['calibrated'][name]['ece']*100:.1f}%"
+            print(line)
+            for label in ("raw", "calibrated"):
+                if label not in entry:
+                    continue
+                print(f"       {label:<10}  predicted  observed      n")
+                for b in entry[label][name]["bins"]:
+                    print(f"                   {b['predicted']*100:8.1f}% {b['observed']*100:8.1f}% {b['n']:6d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit and inspect probability calibration per league.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--competition")
+    parser.add_argument("--fit", action="store_true", help="fit and store a calibration per league")
+    parser.add_argument("--method", choices=METHODS, default=DEFAULT_METHOD)
+    parser.add_argument("--bins", type=int, default=RELIABILITY_BINS)
+    parser.add_argument("--json", action="store_true", help="print the reliability report as JSON")
+    args = parser.parse_args()
+
+    conn = init_db(args.db)
+    if args.fit:
+        for s in fit_and_store(conn, args.method, args.competition):
+            if "log_loss_before" in s:
+                print(f"{s['competition']}: {s['n']} predictions | log-loss {s['log_loss_before']:.4f} → "
+                      f"{s['log_loss_after']:.4f} | held-out {s['holdout_log_loss_before']:.4f} → "
+                      f"{s['holdout_log_loss_after']:.4f} | {'stored' if s['stored'] else s['reason']}")
+            else:
+                print(f"{s['competition']}: {s['n']} predictions | skipped: {s['reason']}")
+
+    report = reliability_report(conn, args.competition, args.bins)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+    conn.close()
@@ -0,0 +1,95 @@
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from footballpredictions import DB_PATH, init_db
+
+
+# Reader and maintenance for the prediction changefeed (the prediction_changes table written by
+# save_prediction_to_db). Every new or revised prediction gets an entry with a strictly increasing seq, so a
+# consumer remembers the last seq it processed and asks only for what came after it.
+
+BATCH_SIZE = 500
+POLL_SECONDS = 30
+
+# Entries older than this are compacted: superseded revisions of a prediction are removed
+COMPACT_AFTER_DAYS = 30
+
+
+def _change(row):
+    seq, match_id, change, changed_at, payload = row
+    return {"seq": seq, "match_id": match_id, "change": change, "changed_at": changed_at,
+            "prediction": json.loads(payload)}
+
+
+# Returns up to limit changes with seq > since, oldest first, as dicts of
+# {seq, match_id, change ("insert"/"update"), changed_at, prediction}.
+def read_changes(conn, since=0, limit=BATCH_SIZE):
+    c = conn.execute('''SELECT seq, match_id, change, changed_at, payload FROM prediction_changes
+                        WHERE seq > ? ORDER BY seq LIMIT ?''', (since, limit))
+    return [_change(row) for row in c.fetchall()]
+
+
+# Yields every change after since, reading one batch at a time.
+def iter_changes(conn, since=0, batch_size=BATCH_SIZE):
+    while True:
+        changes = read_changes(conn, since, batch_size)
+        yield from changes
+        if len(changes) < batch_size:
+            return
+        since = changes[-1]["seq"]
+
+
+def latest_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM prediction_changes").fetchone()[0]
+
+
+# Compacts entries written more than older_than_days ago. By default only entries superseded by a later change
+# to the same prediction are removed, so a consumer starting from 0 still receives the current version of every
+# prediction. purge=True removes every old entry; consumers further behind than that must re-read the table.
+# Returns the number of entries removed.
+def compact_changes(conn, older_than_days=COMPACT_AFTER_DAYS, purge=False):
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    if purge:
+        c = conn.execute("DELETE FROM prediction_changes WHERE changed_at < ?", (cutoff,))
+    else:
+        c = conn.execute('''DELETE FROM prediction_changes
+                            WHERE changed_at < ?
+                              AND seq < (SELECT MAX(p.seq) FROM prediction_changes p
+                                         WHERE p.match_id = prediction_changes.match_id)''', (cutoff,))
+    removed = c.rowcount
+    conn.commit()
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print prediction changes as NDJSON, one JSON object per line.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--since", type=int, default=0, help="last seq already processed")
+    parser.add_argument("--follow", action="store_true", help="keep polling for new changes")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="seconds between polls with --follow")
+    parser.add_argument("--compact", action="store_true", help="compact old entries and exit")
+    parser.add_argument("--older-than-days", type=float, default=COMPACT_AFTER_DAYS)
+    parser.add_argument("--purge", action="store_true", help="with --compact, remove every old entry")
+    args = parser.parse_args()
+
+    conn = init_db(args.db)
+    if args.compact:
+        removed = compact_changes(conn, args.older_than_days, args.purge)
+        print(f"Removed {removed} changefeed entries.", file=sys.stderr)
+    else:
+        since = args.since
+        try:
+            while True:
+                for change in iter_changes(conn, since):
+                    print(json.dumps(change), flush=True)
+                    since = change["seq"]
+                if not args.follow:
+                    break
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            pass
+        print(f"Last seq: {since}", file=sys.stderr)
+    conn.close()
@@ -0,0 +1,226 @@
+import argparse
+import heapq
+import json
+import math
+
+from footballpredictions import DB_PATH, init_db
+from query import iter_predictions
+
+
+# Joint probabilities of picks across many fixtures: accumulators, "at least k of n correct" and the most likely
+# (or best value) combinations of a matchday, from the stored probabilities.
+# Fixtures are treated as independent. At-least-k comes from a dynamic program over fixtures (the distribution of
+# the number of correct picks, O(n²)); the top combinations from a best-first search with a heap, which only
+# visits the combinations it returns and their neighbours instead of all 3^n of them.
+
+# Picks by market, as the outcomes each one covers
+PICKS = {
+    "1": ("HOME",),
+    "X": ("DRAW",),
+    "2": ("AWAY",),
+    "1X": ("HOME", "DRAW"),
+    "X2": ("DRAW", "AWAY"),
+    "12": ("HOME", "AWAY"),
+}
+MARKETS = {
+    "result": ("1", "X", "2"),
+    "double": ("1X", "X2", "12"),
+    "all": tuple(PICKS),
+}
+
+TOP_N = 10
+
+_COLUMNS = ("match_id", "date", "competition", "matchday", "home_team", "away_team",
+            "home_prob", "draw_prob", "away_prob", "prediction")
+
+
+# The latest stored prediction of every fixture of a matchday (or any other query.py filters), in kickoff order.
+def load_fixtures(conn, **filters):
+    fixtures = {}
+    for row in iter_predictions(conn, page_size=500, columns=_COLUMNS, **filters):
+        fixtures[row["match_id"]] = row
+    return list(fixtures.values())
+
+
+def pick_probability(fixture, pick):
+    probs = {"HOME": fixture["home_prob"], "DRAW": fixture["draw_prob"], "AWAY": fixture["away_prob"]}
+    return sum(probs[outcome] for outcome in PICKS[pick])
+
+
+# The pick matching a stored prediction text: "X Win", "Draw", "X OR Draw" or "Draw OR X".
+def prediction_pick(fixture):
+    covered = set()
+    for side in (fixture["prediction"] or "").split(" OR "):
+        if side == "Draw":
+            covered.add("DRAW")
+        elif side in (fixture["home_team"], f"{fixture['home_team']} Win"):
+            covered.add("HOME")
+        elif side in (fixture["away_team"], f"{fixture['away_team']} Win"):
+            covered.add("AWAY")
+    for pick, outcomes in PICKS.items():
+        if covered == set(outcomes):
+            return pick
+    return None
+
+
+# Probability that every pick is correct. picks holds one pick per fixture.
+def joint_probability(fixtures, picks):
+    return math.prod(pick_probability(f, pick) for f, pick in zip(fixtures, picks))
+
+
+# Distribution of the number of correct picks: dist[j] is the probability that exactly j are correct.
+def correct_distribution(fixtures, picks):
+    dist = [1.0]
+    for f, pick in zip(fixtures, picks):
+        p = pick_probability(f, pick)
+        nxt = [0.0] * (len(dist) + 1)
+        for j, q in enumerate(dist):
+            nxt[j] += q * (1 - p)
+            nxt[j + 1] += q * p
+        dist = nxt
+    return dist
+
+
+# Probability that at least k picks are correct, for every k from 0 to n.
+def at_least(fixtures, picks):
+    tail = []
+    total = 0.0
+    for q in reversed(correct_distribution(fixtures, picks)):
+        total += q
+        tail.append(min(total, 1.0))
+    return tail[::-1]
+
+
+# Candidate picks of each fixture with their log values, best first. The value of a pick is its probability, or
+# probability times decimal odds when odds are given ({match_id: {pick: odds}}; picks without odds are left out).
+def _options(fixtures, market, odds):
+    options = []
+    for f in fixtures:
+        choices = []
+        for pick in MARKETS[market]:
+            value = pick_probability(f, pick)
+            if odds is not None:
+                price = odds.get(f["match_id"], {}).get(pick)
+                if price is None:
+                    continue
+                value *= price
+            if value > 0:
+                choices.append((math.log(value), pick))
+        choices.sort(reverse=True)
+        options.append(choices)
+    return options
+
+
+# The n best combinations of `size` fixtures (every fixture when size is None), one pick each, ranked by
+# joint probability or, with odds, by expected return per unit stake (probability times combined odds).
+# Returns dicts of {legs: [(fixture, pick)], probability, odds, expected_return}.
+#
+# Best-first search: fixtures are ordered by their best value, and a state is a set of legs, each a fixture
+# position and the rank of its pick. The first state takes the best pick of the best fixtures; from any state a
+# leg either moves to its next best pick or, while at its best pick, to the next fixture in order not already
+# used. Both moves can only lower the value, and every combination can be reached this way, so states come off
+# the heap in order.
+def top_combinations(fixtures, n=TOP_N, size=None, market="result", odds=None):
+    options = _options(fixtures, market, odds)
+    order = sorted((i for i in range(len(fixtures)) if options[i]), key=lambda i: -options[i][0][0])
+    size = len(order) if size is None else size
+    if not 0 < size <= len(order):
+        return []
+
+    def value(state):
+        return sum(options[order[pos]][rank][0] for pos, rank in state)
+
+    start = tuple((pos, 0) for pos in range(size))
+    heap = [(-value(start), start)]
+    seen = {start}
+    results = []
+    while heap and len(results) < n:
+        neg_value, state = heapq.heappop(heap)
+        results.append(state)
+        used = {pos for pos, _ in state}
+        for i, (pos, rank) in enumerate(state):
+            moves = []
+            if rank + 1 < len(options[order[pos]]):
+                moves.append((pos, rank + 1))
+            if rank == 0 and pos + 1 < len(order) and pos + 1 not in used:
+                moves.append((pos + 1, 0))
+            for leg in moves:
+                nxt = tuple(sorted(state[:i] + (leg,) + state[i + 1:]))
+                if nxt not in seen:
+                    seen.add(nxt)
+                    heapq.heappush(heap, (-value(nxt), nxt))
+
+    combinations = []
+    for state in results:
+        legs = [(fixtures[order[pos]], options[order[pos]][rank][1]) for pos, rank in state]
+        legs.sort(key=lambda leg: (leg[0]["date"] or "", leg[0]["match_id"]))
+        probability = math.prod(pick_probability(f, pick) for f, pick in legs)
+        combined_odds = None
+        if odds is not None:
+            combined_odds = math.prod(odds[f["match_id"]][pick] for f, pick in legs)
+        combinations.append({
+            "legs": legs,
+            "probability": probability,
+            "odds": combined_odds,
+            "expected_return": probability * combined_odds if combined_odds is not None else None
+        })
+    return combinations
+
+
+def format_leg(fixture, pick):
+    return f"{fixture['home_team']} vs {fixture['away_team']}: {pick} ({pick_probability(fixture, pick)*100:.1f}%)"
+
+
+def format_combination(rank, combination):
+    line = f"#{rank} {combination['probability']*100:.4g}%"
+    if combination["odds"] is not None:
+        line += f" | odds {combination['odds']:.2f} | expected return {combination['expected_return']:.3f}"
+    return line + "\n" + "\n".join("   " + format_leg(f, pick) for f, pick in combination["legs"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price accumulators and pick combinations across fixtures.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--competition")
+    parser.add_argument("--matchday", type=int)
+    parser.add_argument("--date-from", help="YYYY-MM-DD")
+    parser.add_argument("--date-to", help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--top", type=int, default=TOP_N, help="number of combinations to list")
+    parser.add_argument("--size", type=int, help="legs per combination (default: every fixture)")
+    parser.add_argument("--market", choices=MARKETS, default="result")
+    parser.add_argument("--odds", help='JSON file of decimal odds: {"MATCH_ID": {"1": 2.1, "X": 3.4, "2": 3.6}}')
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    conn = init_db(args.db)
+    fixtures = load_fixtures(conn, competition=args.competition, matchday=args.matchday,
+                             date_from=args.date_from, date_to=args.date_to)
+    conn.close()
+
+    odds = None
+    if args.odds:
+        with open(args.odds) as f:
+            odds = {int(match_id): prices for match_id, prices in json.load(f).items()}
+
+    # The stored predictions as one accumulator, and how many of them are likely to come in
+    picked = [f for f in fixtures if prediction_pick(f)]
+    picks = [prediction_pick(f) for f in picked]
+    tail = at_least(picked, picks)
+    top = top_combinations(fixtures, args.top, args.size, args.market, odds)
+
+    if args.json:
+        print(json.dumps({
+            "predictions": {"legs": [[f["match_id"], pick] for f, pick in zip(picked, picks)],
+                            "probability": joint_probability(picked, picks), "at_least": tail},
+            "top": [dict(c, legs=[[f["match_id"], pick] for f, pick in c["legs"]]) for c in top]
+        }))
+    else:
+        print(f"Stored predictions of {len(picked)} fixture(s):")
+        for f, pick in zip(picked, picks):
+            print("   " + format_leg(f, pick))
+        print(f"All correct: {joint_probability(picked, picks)*100:.4g}%")
+        for k in range(len(picked), 0, -1):
+            print(f"At least {k:>2} correct: {tail[k]*100:6.2f}%")
+        print(f"\nTop {len(top)} combinations ({args.market}{', by expected return' if odds else ''}):")
+        for rank, combination in enumerate(top, 1):
+            print(format_combination(rank, combination))
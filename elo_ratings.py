@@ -0,0 +1,172 @@
+import bisect
+import math
+import threading
+
+
+# Elo-style team strength ratings, maintained incrementally as an alternative base rating to compute_home_away_rating.
+# Every finished match is processed exactly once, in chronological order, with an O(1) update per match.
+# Each team keeps a dated snapshot list so the rating entering any historical date can be looked up with a bisect.
+# A result reported after later matches were processed rewinds the ratings to its date and replays from there.
+# Updates and reads share a lock, so worker threads never see a rating halfway through such a replay.
+
+ELO_START = 1500.0
+ELO_K = 20.0
+
+# Every team starts with the same home advantage (in Elo points) and then learns its own, more slowly than its rating.
+ELO_HOME_ADVANTAGE = 60.0
+ELO_HOME_K = 4.0
+
+# ratings_to_probs applies a natural-log logistic with k = 2.5 to the rating difference, while Elo uses base 10 over 400 points.
+# Dividing an Elo difference by this scale gives the same win expectancy in ratings_to_probs units.
+ELO_SCALE = 400 * 2.5 / math.log(10)
+
+
+# Creates an empty rating state. Teams are added the first time they appear in a processed match.
+def new_elo_state():
+    return {
+        "teams": {},
+        "processed": set(),
+        "last_date": "",
+        # Every applied result in chronological order, kept for replaying after a late result
+        "results": [],
+        "result_dates": [],
+        "lock": threading.RLock()
+    }
+
+
+def _get_team(state, team_id):
+    team = state["teams"].get(team_id)
+    if team is None:
+        team = {
+            "rating": ELO_START,
+            "home_adv": ELO_HOME_ADVANTAGE,
+            "dates": [],
+            "snapshots": []
+        }
+        state["teams"][team_id] = team
+    return team
+
+
+# Goal-margin multiplier (eloratings.net): a one-goal win counts once, two goals 1.5x, then (11 + N) / 8.
+def goal_margin_multiplier(margin):
+    margin = abs(margin)
+    if margin <= 1:
+        return 1.0
+    if margin == 2:
+        return 1.5
+    return (11 + margin) / 8
+
+
+# Expected score for the home team given both ratings and the home team's own home advantage.
+def elo_expected(home_rating, away_rating, home_adv):
+    return 1 / (1 + 10 ** (-(home_rating + home_adv - away_rating) / 400))
+
+
+def _apply(state, date, home_id, away_id, gh, ga):
+    home = _get_team(state, home_id)
+    away = _get_team(state, away_id)
+
+    expected = elo_expected(home["rating"], away["rating"], home["home_adv"])
+    if gh > ga:
+        actual = 1.0
+    elif gh < ga:
+        actual = 0.0
+    else:
+        actual = 0.5
+
+    delta = ELO_K * goal_margin_multiplier(gh - ga) * (actual - expected)
+    home["rating"] += delta
+    away["rating"] -= delta
+    # Only the home side's venue advantage learns from this result
+    home["home_adv"] += ELO_HOME_K * (actual - expected)
+
+    for team in (home, away):
+        team["dates"].append(date)
+        team["snapshots"].append((team["rating"], team["home_adv"]))
+
+
+# Rewinds every team to its snapshot from before `date` and re-applies the results from that date onwards.
+def _rebuild_from(state, date):
+    for team in state["teams"].values():
+        idx = bisect.bisect_left(team["dates"], date)
+        del team["dates"][idx:]
+        del team["snapshots"][idx:]
+        team["rating"], team["home_adv"] = team["snapshots"][-1] if idx else (ELO_START, ELO_HOME_ADVANTAGE)
+    start = bisect.bisect_left(state["result_dates"], date)
+    for result in state["results"][start:]:
+        _apply(state, *result)
+
+
+# Applies one finished match to the state. Matches already processed and unfinished matches are skipped, so
+# replaying an overlapping window is safe. A match older than the last processed date (e.g. a rescheduled game
+# reported late) rebuilds the ratings from its date. Returns True if the ratings changed.
+def update_elo(state, match):
+    match_id = match.get("id")
+    if match_id in state["processed"]:
+        return False
+
+    score = match.get("score", {}).get("fullTime", {})
+    gh = score.get("home")
+    ga = score.get("away")
+    if gh is None or ga is None:
+        return False
+
+    date = match.get("utcDate", "")
+    result = (date, match["homeTeam"]["id"], match["awayTeam"]["id"], gh, ga)
+    with state["lock"]:
+        if match_id in state["processed"]:
+            return False
+        # After any results already held for the same date, so their order is kept
+        idx = bisect.bisect_right(state["result_dates"], date)
+        state["results"].insert(idx, result)
+        state["result_dates"].insert(idx, date)
+        state["processed"].add(match_id)
+
+        if date < state["last_date"]:
+            _rebuild_from(state, date)
+        else:
+            _apply(state, *result)
+            state["last_date"] = date
+    return True
+
+
+# Replays a batch of matches in chronological order. Returns the number of matches that updated the ratings.
+def replay_matches(state, matches):
+    updated = 0
+    with state["lock"]:
+        for m in sorted(matches, key=lambda m: m.get("utcDate", "")):
+            if update_elo(state, m):
+                updated += 1
+    return updated
+
+
+# Returns (rating, home_adv) for a team as it stood before any match on or after as_of (an ISO date or timestamp).
+# Without as_of, the latest values are returned. Unknown teams get the starting values.
+def elo_as_of(state, team_id, as_of=None):
+    with state["lock"]:
+        team = state["teams"].get(team_id)
+        if team is None:
+            return ELO_START, ELO_HOME_ADVANTAGE
+        if as_of is None:
+            return team["rating"], team["home_adv"]
+
+        idx = bisect.bisect_left(team["dates"], as_of) - 1
+        if idx < 0:
+            return ELO_START, ELO_HOME_ADVANTAGE
+        return team["snapshots"][idx]
+
+
+# Converts a team's Elo into the rating units of compute_home_away_rating, so it can replace the form-based base rating.
+# The home side also gets its own learned home advantage, in place of the fixed +0.12.
+def compute_elo_rating(state, team_id, is_home, as_of=None):
+    rating, home_adv = elo_as_of(state, team_id, as_of)
+    if is_home:
+        rating += home_adv
+    return (rating - ELO_START) / ELO_SCALE
+
+
+# Returns a base-rating function for predict_match backed by this state.
+def elo_rating_fn(state, as_of=None):
+    def rating_fn(team_id, is_home):
+        return compute_elo_rating(state, team_id, is_home, as_of)
+    return rating_fn
@@ -1,9 +1,18 @@
 # API Key for football-data.org
+import atexit
+import json
 import math
-import requests
 import sqlite3  
-import pandas as pd
+import threading
+from datetime import datetime, timedelta, timezone
 
+from elo_ratings import new_elo_state, replay_matches, elo_rating_fn
+from team_form import new_form_index, add_matches, form_stats_fn
+from standings import new_standings_state, add_results, standings_fn as local_standings_fn
+from schedule_index import (
+    new_schedule_index, add_matches as add_scheduled_matches, congestion_fn as schedule_congestion_fn
+)
+from snapshot import load_snapshot, cached_json, save_snapshot
 
 
 # Put your actual API key here as a string
@@ -17,6 +26,8 @@ HEADERS = {
 
 REQUEST_TIMEOUT = 10  # seconds
 
+DB_PATH = "LEAGUE_predictions.db"
+
 # Put teams in here for proper tier-based adjustments. This is a simplified categorization and can be adjusted based on current season performance.    
 BIG_TEAMS = {
 }
@@ -33,10 +44,78 @@ RIVALRIES = {
 
 }
 
+# Seasons (start years, e.g. 2023) to replay into Elo ratings on startup. When set, Elo replaces the form-based base rating.
+ELO_SEASONS = []
+
+# Seasons to load into the local form index on startup. When set, venue form/attack/defense/momentum come from
+# prefix sums over these results instead of two venue fetches per prediction, using the window and half-life below.
+FORM_SEASONS = []
+FORM_WINDOW = 20
+FORM_HALF_LIFE = None  # in matches, e.g. 8; None weights the window equally
+
+# Current season (start year). When set, the league table is computed locally from its results
+# instead of fetching the standings for every prediction.
+STANDINGS_SEASON = None
+
+# Bootstrap resamples for probability intervals (e.g. 2000); 0 disables them. With intervals, a favourite whose
+# interval overlaps the draw's is also given as "X OR Draw".
+BOOTSTRAP_RESAMPLES = 0
+
+# File to keep API responses (fixtures, standings, venue histories, H2H, whole seasons) in between runs, e.g.
+# "LEAGUE_snapshot.bin", so a restart predicts straight away; outdated parts are refreshed in the background.
+# None (the default) always calls the API.
+SNAPSHOT_PATH = None
+
+# Days of matches in every competition (cups and European games included) to index before today, e.g. 21. When set,
+# ratings are adjusted for fixture congestion: short rest and many recent matches. Fixtures up to
+# SCHEDULE_DAYS_AHEAD days ahead are indexed too, so matches played before a predicted kickoff also count.
+SCHEDULE_DAYS = 0
+SCHEDULE_DAYS_AHEAD = 14
+
+# Apply the league's fitted probability calibration (python calibration.py --fit) after ratings_to_probs.
+CALIBRATE = False
+
+# Candidate model configurations scored in shadow on every saved prediction, from the same inputs (no extra API
+# calls), and stored per version for comparison with python shadow.py. Keys of vector_model.DEFAULT_PARAMS, e.g.
+# {"form-heavy": {"form": 0.55, "attack": 0.25}, "flat-draw": {"draw_width": 0.10}}
+SHADOW_MODELS = {}
+
+# Predicting a fixture that already has a stored prediction overwrites it (recorded as an update in the
+# changefeed) instead of skipping the save.
+REVISE_PREDICTIONS = False
+
 # REPLACE ALL APPEARANCES OF "LEAGUE" WITH THE ACTUAL LEAGUE CODE YOU WANT TO ANALYZE (e.g., "PL" for Premier League)
 
+# Per-thread count of failed API calls, so callers like the scheduler can tell a complete prediction
+# from one that silently fell back to defaults because a request failed.
+_fetch_errors = threading.local()
+
+def fetch_error_count():
+    return getattr(_fetch_errors, "count", 0)
+
+def reset_fetch_errors():
+    _fetch_errors.count = 0
+
+# Warm-start snapshot used by get_json once enable_snapshot has been called
+_snapshot = None
+
+# Loads the snapshot file and writes it back on exit. Returns the snapshot state.
+def enable_snapshot(path=SNAPSHOT_PATH):
+    global _snapshot
+    _snapshot = load_snapshot(path)
+    atexit.register(save_snapshot, _snapshot)
+    return _snapshot
+
 # API HELPER
 def get_json(endpoint, params=None):
+    if _snapshot is not None:
+        return cached_json(_snapshot, endpoint, params, fetch_json)
+    return fetch_json(endpoint, params)
+
+# Calls the API directly, bypassing the snapshot.
+def fetch_json(endpoint, params=None):
+    # Imported on the first real request; a run served from the snapshot never pays for loading it
+    import requests
     url = BASE_URL + endpoint
     try:
         resp = requests.get(url, headers=HEADERS, params=params, timeout=REQUEST_TIMEOUT)
@@ -46,6 +125,7 @@ def get_json(endpoint, params=None):
         return data
     except Exception as e:
         print(f"ERROR: {e} | URL: {url}")
+        _fetch_errors.count = fetch_error_count() + 1
         return None
 
 # Gets upcoming fixtures for the specified league sorted by date, limited to a certain number.  
@@ -62,6 +142,88 @@ def get_upcoming_LEAGUE_fixtures(limit=20):
     return matches[:limit]
 
 
+# Fetches all matches of a competition in a single call, optionally filtered by status, season or date window, sorted by date.
+# Used to replay whole seasons at once instead of calling the API per team or per match.
+def get_competition_matches(competition="LEAGUE", status=None, season=None, date_from=None, date_to=None):
+    endpoint = f"competitions/{competition}/matches"
+    params = {}
+    if status:
+        params["status"] = status
+    if season:
+        params["season"] = season
+    if date_from:
+        params["dateFrom"] = date_from
+    if date_to:
+        params["dateTo"] = date_to
+    data = get_json(endpoint, params)
+
+    if not data:
+        return []
+
+    matches = data.get("matches", [])
+    matches.sort(key=lambda m: m.get("utcDate", ""))
+    return matches
+
+# Finished matches of one season, fetched once per run so the Elo and form histories share the same download.
+_finished_seasons = {}
+
+def get_finished_season(season, competition="LEAGUE"):
+    key = (competition, season)
+    if key not in _finished_seasons:
+        matches = get_competition_matches(competition, status="FINISHED", season=season)
+        if not matches:
+            return []
+        _finished_seasons[key] = matches
+    return _finished_seasons[key]
+
+# The matches endpoint accepts at most this many days per request
+MATCHES_WINDOW_DAYS = 10
+
+# Matches of every competition the API key covers between two dates (YYYY-MM-DD), in MATCHES_WINDOW_DAYS requests.
+def get_matches_all_competitions(date_from, date_to):
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d")
+    matches = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=MATCHES_WINDOW_DAYS - 1), end)
+        params = {"dateFrom": start.strftime("%Y-%m-%d"), "dateTo": chunk_end.strftime("%Y-%m-%d")}
+        data = get_json("matches", params)
+        if data:
+            matches.extend(data.get("matches", []))
+        start = chunk_end + timedelta(days=1)
+    return matches
+
+# Builds Elo ratings by replaying the finished matches of the given seasons, one API call per season.
+def build_elo_state(seasons, competition="LEAGUE"):
+    state = new_elo_state()
+    for season in sorted(seasons):
+        replay_matches(state, get_finished_season(season, competition))
+    return state
+
+# Builds the venue form index (prefix sums per team and venue) from the given seasons, one API call per season.
+def build_form_index(seasons, competition="LEAGUE"):
+    index = new_form_index()
+    for season in sorted(seasons):
+        add_matches(index, get_finished_season(season, competition))
+    return index
+
+# Builds the local league table from one season's finished results (one API call).
+def build_standings_state(season, competition="LEAGUE"):
+    state = new_standings_state(competition)
+    add_results(state, get_finished_season(season, competition))
+    return state
+
+
+# Indexes every team's matches in all competitions from days_back before today to days_ahead after it.
+# Also used to refresh an existing index: matches it already holds are only updated if they were rescheduled.
+def build_schedule_index(days_back, days_ahead=SCHEDULE_DAYS_AHEAD, index=None):
+    index = new_schedule_index() if index is None else index
+    today = datetime.now(timezone.utc).date()
+    add_scheduled_matches(index, get_matches_all_competitions(str(today - timedelta(days=days_back)),
+                                                              str(today + timedelta(days=days_ahead))))
+    return index
+
+
 # Utility function to print fixtures in a numbered list format for user selection. Shows matchday, teams, and date. 
 def print_numbered_fixtures(matches):
     print("\nUpcoming LEAGUE Fixtures:")
@@ -97,10 +259,8 @@ def get_head_to_head(match_id, limit=5):
 
     return data
 
-# Computes the head-to-head boost for home and away teams based on the last 5 matches. 
-# Each win gives a boost of 0.04 to the winner's rating, while the loser gets a negative boost. 
-# Draws do not affect ratings. Returns the calculated boosts for both teams.
-def compute_h2h_boost(h2h_data, home_id, away_id):
+# Counts the wins of each side in the last 5 head-to-head matches. Returns (home_wins, away_wins).
+def compute_h2h_wins(h2h_data, home_id, away_id):
     if not h2h_data or "matches" not in h2h_data:
         return 0, 0
 
@@ -134,6 +294,14 @@ def compute_h2h_boost(h2h_data, home_id, away_id):
         elif winner == away_id:
             away_wins += 1
 
+    return home_wins, away_wins
+
+# Computes the head-to-head boost for home and away teams based on the last 5 matches. 
+# Each win gives a boost of 0.04 to the winner's rating, while the loser gets a negative boost. 
+# Draws do not affect ratings. Returns the calculated boosts for both teams.
+def compute_h2h_boost(h2h_data, home_id, away_id):
+    home_wins, away_wins = compute_h2h_wins(h2h_data, home_id, away_id)
+
     # Difference → boost
     diff = home_wins - away_wins
 
@@ -145,59 +313,178 @@ def compute_h2h_boost(h2h_data, home_id, away_id):
 # Initializes the SQLite database and creates the necessary tables if they do not already exist. 
 # This function ensures that the database is ready to store predictions and related data. 
 # It returns a connection object that can be used for subsequent database operations.
-def init_db():
-    conn = sqlite3.connect('LEAGUE_predictions.db')
+def init_db(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
     c = conn.cursor()
     # Create tables (simplified for brevity, ensures they exist)
     c.execute('''CREATE TABLE IF NOT EXISTS predictions 
                  (match_id INTEGER, date TEXT, home_team TEXT, away_team TEXT, 
                   home_prob REAL, draw_prob REAL, away_prob REAL, 
                   home_rating REAL, away_rating REAL, prediction TEXT)''')
+    # Columns added after the original schema; older databases are migrated in place
+    added = ensure_columns(c, "predictions", {
+        "competition": "TEXT",
+        "matchday": "INTEGER",
+        "outcome": "TEXT",
+        "home_goals": "INTEGER",
+        "away_goals": "INTEGER",
+        "details": "TEXT",
+        "home_prob_lo": "REAL",
+        "home_prob_hi": "REAL",
+        "draw_prob_lo": "REAL",
+        "draw_prob_hi": "REAL",
+        "away_prob_lo": "REAL",
+        "away_prob_hi": "REAL",
+        "predicted_outcome": "TEXT",
+        "features": "TEXT"
+    })
+    if "predicted_outcome" in added:
+        c.execute('''UPDATE predictions SET predicted_outcome =
+                         CASE WHEN home_prob >= draw_prob AND home_prob >= away_prob THEN 'HOME'
+                              WHEN draw_prob >= away_prob THEN 'DRAW'
+                              ELSE 'AWAY' END''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_match_id ON predictions (match_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_outcome ON predictions (outcome)")
+    # Composite indexes for query.py: each filter column is followed by date, so rows come out in page order
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_date ON predictions (date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_home_team ON predictions (home_team, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_away_team ON predictions (away_team, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_competition ON predictions (competition, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_matchday ON predictions (competition, matchday, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_predicted ON predictions (predicted_outcome, date)")
+    # Append-only changefeed of every saved or revised prediction, read with changefeed.py.
+    # AUTOINCREMENT keeps seq strictly increasing even after old entries are compacted away.
+    c.execute('''CREATE TABLE IF NOT EXISTS prediction_changes
+                 (seq INTEGER PRIMARY KEY AUTOINCREMENT, match_id INTEGER, change TEXT,
+                  changed_at TEXT, payload TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_prediction_changes_match_id ON prediction_changes (match_id, seq)")
     conn.commit()
     return conn
 
+# Adds any missing columns to an existing table, so databases created by older versions keep working.
+# Returns the names of the columns that were added.
+def ensure_columns(c, table, columns):
+    c.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in c.fetchall()}
+    added = []
+    for name, decl in columns.items():
+        if name not in existing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            added.append(name)
+    return added
+
+# HOME, DRAW or AWAY, whichever is most likely (ties go to HOME, then DRAW).
+def predicted_outcome(p_home, p_draw, p_away):
+    if p_home >= p_draw and p_home >= p_away:
+        return "HOME"
+    if p_draw >= p_away:
+        return "DRAW"
+    return "AWAY"
+
 # Saves the prediction data for a specific match into the SQLite database. It checks if a prediction for the given match already exists to avoid duplicates.
 # If not, it inserts a new record with the match details, probabilities, ratings, and the final prediction text. 
 # The function commits the transaction to ensure data is saved and provides feedback on the operation's success or if a duplicate was detected.   
-def save_prediction_to_db(conn, match, h_rating, a_rating, p_home, p_draw, p_away, pred_text):
+# The optional details (rating breakdown from analyse_match) are stored as JSON for reports, with their input
+# features in a column of their own for what-if re-scoring.
+# With revise=True an existing prediction is overwritten instead (its reconciled result is kept).
+# Every insert or revision is also appended to the changefeed, in the same transaction.
+# With quiet=True nothing is printed (the scheduler's workers report through their own log line).
+# Returns True if a row was written.
+def save_prediction_to_db(conn, match, h_rating, a_rating, p_home, p_draw, p_away, pred_text, details=None,
+                          revise=False, quiet=False):
     c = conn.cursor()
     
     # Check if prediction already exists for this match to avoid duplicates
     c.execute("SELECT * FROM predictions WHERE match_id = ?", (match['id'],))
     data = c.fetchone()
-    
+
+    if data is not None and not revise:
+        if not quiet:
+            print("⚠️ Prediction already exists in DB, skipping save.")
+        return False
+
+    row = {
+        "match_id": match['id'],
+        "date": match['utcDate'],
+        "home_team": match['homeTeam']['name'],
+        "away_team": match['awayTeam']['name'],
+        "home_prob": round(p_home, 4),
+        "draw_prob": round(p_draw, 4),
+        "away_prob": round(p_away, 4),
+        "home_rating": round(h_rating, 4),
+        "away_rating": round(a_rating, 4),
+        "prediction": pred_text,
+        "competition": match.get('competition', {}).get('code', 'LEAGUE'),
+        "matchday": match.get('matchday'),
+        "details": None,
+        "features": None
+    }
+    if details is not None:
+        details = dict(details)
+        features = details.pop("features", None)
+        row["details"] = json.dumps(details)
+        row["features"] = json.dumps(features) if features is not None else None
+    row["predicted_outcome"] = predicted_outcome(row["home_prob"], row["draw_prob"], row["away_prob"])
+    intervals = (details or {}).get("intervals") or {}
+    for key in ("home", "draw", "away"):
+        lo, hi = intervals.get(key, (None, None))
+        row[f"{key}_prob_lo"] = round(lo, 4) if lo is not None else None
+        row[f"{key}_prob_hi"] = round(hi, 4) if hi is not None else None
+
+    columns = list(row)
+    if data is None:
+        c.execute(f'''INSERT INTO predictions ({", ".join(columns)})
+                      VALUES ({", ".join("?" * len(columns))})''', [row[k] for k in columns])
+    else:
+        c.execute(f'''UPDATE predictions SET {", ".join(f"{k} = ?" for k in columns)}
+                      WHERE match_id = ?''', [row[k] for k in columns] + [row["match_id"]])
+    log_prediction_change(c, "insert" if data is None else "update", row)
+    conn.commit()
+
+    if quiet:
+        return True
     if data is None:
-        c.execute('''INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (match['id'], match['utcDate'], match['homeTeam']['name'], match['awayTeam']['name'],
-                   round(p_home, 4), round(p_draw, 4), round(p_away, 4),
-                   round(h_rating, 4), round(a_rating, 4), pred_text))
-        conn.commit()
-        print(f"✅ Data saved to SQL for {match['homeTeam']['name']} vs {match['awayTeam']['name']}")
+        print(f"✅ Data saved to SQL for {row['home_team']} vs {row['away_team']}")
     else:
-        print("⚠️ Prediction already exists in DB, skipping save.")
+        print(f"✅ Prediction revised for {row['home_team']} vs {row['away_team']}")
+    return True
+
+# Appends a saved prediction row to the changefeed. Runs on the caller's cursor, so the entry commits or rolls
+# back together with the write it describes.
+def log_prediction_change(c, change, row):
+    payload = dict(row)
+    for key in ("details", "features"):
+        if payload.get(key):
+            payload[key] = json.loads(payload[key])
+    c.execute('''INSERT INTO prediction_changes (match_id, change, changed_at, payload)
+                 VALUES (?, ?, ?, ?)''',
+              (row["match_id"], change, datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+               json.dumps(payload)))
 
 
 # Applies tier-based rating adjustments based on the team's classification as Big, Mid, or Low.
-def team_tier_bonus(team_name):
+def team_tier_bonus(team_name, big_teams=None, mid_teams=None, low_teams=None):
     """
     Apply tier-based rating adjustments.
     Big = +0.10
     Mid = 0
     Low = -0.10
+    Tiers default to BIG_TEAMS, MID_TEAMS and LOW_TEAMS.
     """
-    if team_name in BIG_TEAMS:
+    if team_name in (BIG_TEAMS if big_teams is None else big_teams):
         return 0.05
-    elif team_name in MID_TEAMS:
+    elif team_name in (MID_TEAMS if mid_teams is None else mid_teams):
         return 0.00
-    elif team_name in LOW_TEAMS:
+    elif team_name in (LOW_TEAMS if low_teams is None else low_teams):
         return -0.05
     else:
         # Any unknown team is considered LOW
         return -0.10
 
 # Applies a rivalry bonus if the home and away teams are known rivals. This increases the draw probability and gives a boost to the underdog team.
-def rivalry_bonus(home_name, away_name):
-    if home_name in RIVALRIES and away_name in RIVALRIES[home_name]:
+def rivalry_bonus(home_name, away_name, rivalries=None):
+    rivalries = RIVALRIES if rivalries is None else rivalries
+    if home_name in rivalries and away_name in rivalries[home_name]:
         return {
             "draw_boost": 0.08,
             "underdog": 0.10
@@ -339,7 +626,10 @@ def get_current_standings():
     if not data or 'standings' not in data:
         print("WARNING: Could not fetch standings")
         return {}
-    
+    return parse_standings(data)
+
+# {team name: {position, points, goal_diff}} from a standings response.
+def parse_standings(data):
     table = data['standings'][0]['table']  # Total standings
     positions = {}
     for entry in table:
@@ -351,179 +641,231 @@ def get_current_standings():
         }
     return positions
 
-# Main function to predict the outcome of a match. It integrates all the steps: fetching stats, applying tier and rivalry adjustments, computing ratings, and converting them to probabilities.
-def predict_match(match):
-    home = match["homeTeam"]["name"]
-    away = match["awayTeam"]["name"]
-    hid = match["homeTeam"]["id"]
-    aid = match["awayTeam"]["id"]
+# One line per recent H2H match, e.g. "2024-03-02: Team A 2-1 Team B → Team A WON".
+def format_h2h_lines(h2h_data):
+    lines = []
+    for m in h2h_data["matches"][:5]:
+        date = m.get("utcDate", "")[:10]
+        hteam = m["homeTeam"]["name"]
+        ateam = m["awayTeam"]["name"]
+        score = m["score"]["fullTime"]
+        gh = score.get("home")
+        ga = score.get("away")
+
+        # Determine winner label
+        if gh is not None and ga is not None:
+            if gh > ga:
+                result = f"{hteam} WON"
+            elif ga > gh:
+                result = f"{ateam} WON"
+            else:
+                result = "DRAW"
+        else:
+            result = "Unknown result"
+
+        lines.append(f"{date}: {hteam} {gh}-{ga} {ateam} → {result}")
+    return lines
+
+# Table-position underdog bias: when the teams are 2–3 places apart, the lower-ranked one gets +0.05 if both are
+# in the same competitive zone (European places 1–8 or relegation places 16–20) and +0.03 otherwise.
+# Returns (home_boost, away_boost, same_zone).
+def table_bias(home_pos, away_pos):
+    pos_diff = abs(home_pos - away_pos)
+
+    # Eligible table zones
+    european_zone = range(1, 9)     # 1–8
+    relegation_zone = range(16, 21) # 16–20
+
+    # Check if both teams are in the SAME competitive zone
+    same_zone = (
+        (home_pos in european_zone and away_pos in european_zone) or
+        (home_pos in relegation_zone and away_pos in relegation_zone)
+    )
+
+    if not 2 <= pos_diff <= 3:
+        return 0, 0, same_zone
+
+    # Much smaller boost outside the competitive zones
+    boost = 0.05 if same_zone else 0.03
+    if home_pos > away_pos:
+        return boost, 0, same_zone
+    return 0, boost, same_zone
+
+# Explanation of a table_bias result, stored with the prediction.
+def describe_table_bias(home, away, home_table, away_table, same_zone):
+    if not home_table and not away_table:
+        return "No table-based boost applied."
+    boosted, boost = (home, home_table) if home_table else (away, away_table)
+    if same_zone:
+        return f"{boosted} boosted (+{boost:.2f}): lower-ranked inside competitive zone."
+    return f"{boosted} boosted (+{boost:.2f}): lower-ranked but outside competitive zone."
+
+# Main function to predict the outcome of a match. The model itself runs silently in predictor.predict_fixture;
+# this feeds it the module's API fetches and configuration and prints every step of the result.
+# rating_fn(team_id, is_home) can replace the venue form/stats base rating (e.g. elo_rating_fn from elo_ratings.py).
+# stats_fn(team_id, venue) can replace the venue match fetches (e.g. form_stats_fn from team_form.py).
+# standings_fn(as_of) can replace the standings fetch (e.g. standings_fn from standings.py).
+# bootstrap > 0 adds percentile intervals for the probabilities from that many resamples of the venue windows and H2H.
+# calibrate_fn(p_home, p_draw, p_away) can recalibrate the probabilities (e.g. calibration_fn from calibration.py).
+# congestion_fn(team_id, date) adjusts for fixture congestion (e.g. congestion_fn from schedule_index.py).
+# Returns the predictor.Prediction, whose details hold the rating breakdown and H2H lines.
+def analyse_match(match, rating_fn=None, stats_fn=None, standings_fn=None, bootstrap=0, calibrate_fn=None,
+                  congestion_fn=None):
+    from predictor import predict_fixture
 
     print(f"\n\n====================== MATCH ANALYSIS ======================")
-    print(f"Selected: {home} vs {away}")
+    print(f"Selected: {match['homeTeam']['name']} vs {match['awayTeam']['name']}")
     print("============================================================\n")
 
-    print("Venue-Specific Form, Attack, Defense")
-    home_home_matches = get_team_matches_by_venue(hid, "HOME", limit=20)
-    home_stats = compute_home_away_stats(home_home_matches, hid)
+    result = predict_fixture(match, predictor_config(bootstrap), get_team_matches_by_venue, get_current_standings,
+                             get_head_to_head, rating_fn, stats_fn, standings_fn, calibrate_fn, congestion_fn)
+    print_prediction(result, bootstrap)
+    return result
 
-    away_away_matches = get_team_matches_by_venue(aid, "AWAY", limit=20)
-    away_stats = compute_home_away_stats(away_away_matches, aid)
 
-    print(f"- {home} (HOME) → Form={home_stats['form_index']}, "
-          f"Attack={home_stats['attack']:.2f}, Defense={home_stats['defense']:.2f}, "
-          f"Momentum={home_stats['momentum']}")
-    print(f"- {away} (AWAY) → Form={away_stats['form_index']}, "
-          f"Attack={away_stats['attack']:.2f}, Defense={away_stats['defense']:.2f}, "
-          f"Momentum={away_stats['momentum']}\n")
+# Same as analyse_match, returning the final ratings, probabilities and prediction text as a tuple.
+def predict_match(match, rating_fn=None, stats_fn=None, standings_fn=None, bootstrap=0, calibrate_fn=None,
+                  congestion_fn=None):
+    result = analyse_match(match, rating_fn, stats_fn, standings_fn, bootstrap, calibrate_fn, congestion_fn)
+    p = result.probabilities
+    return result.home_rating, result.away_rating, p.home, p.draw, p.away, result.prediction
 
-    home_rating = compute_home_away_rating(home_stats, is_home=True)
-    away_rating = compute_home_away_rating(away_stats, is_home=False)
 
-    print(f"➡ Base ratings from form/stats:")
+# Config for predictor.predict_fixture built from the settings at the top of this file.
+def predictor_config(bootstrap=0):
+    from predictor import PredictorConfig
+    return PredictorConfig(API_KEY, big_teams=BIG_TEAMS, mid_teams=MID_TEAMS, low_teams=LOW_TEAMS,
+                           rivalries=RIVALRIES, bootstrap=bootstrap)
+
+
+def _print_ratings(label, home, away, home_rating, away_rating):
+    print(f"➡ {label}:")
     print(f"   {home}: {home_rating:.3f}")
     print(f"   {away}: {away_rating:.3f}\n")
 
-    print("Tier Bonus")
-    home_tier = team_tier_bonus(home)
-    away_tier = team_tier_bonus(away)
 
-    home_rating += home_tier
-    away_rating += away_tier
+# Prints the analysis of a predictor.Prediction step by step, with the ratings after every adjustment.
+def print_prediction(result, bootstrap=0):
+    home = result.home_team
+    away = result.away_team
+    details = result.details
+    features = details["features"]
 
-    print(f"- {home}: {home_tier:+.2f}")
-    print(f"- {away}: {away_tier:+.2f}")
+    if features["base"] is not None:
+        print("Base ratings from rating model (venue form/stats skipped)")
+    else:
+        print("Venue-Specific Form, Attack, Defense")
+        for name, venue, stats in ((home, "HOME", features["home_stats"]), (away, "AWAY", features["away_stats"])):
+            print(f"- {name} ({venue}) → Form={stats['form_index']}, "
+                  f"Attack={stats['attack']:.2f}, Defense={stats['defense']:.2f}, "
+                  f"Momentum={stats['momentum']}" + ("\n" if venue == "AWAY" else ""))
 
-    print(f"➡ Ratings after Tier:")
-    print(f"   {home}: {home_rating:.3f}")
-    print(f"   {away}: {away_rating:.3f}\n")
+    home_rating = details["base"]["home"]
+    away_rating = details["base"]["away"]
+    _print_ratings("Base ratings", home, away, home_rating, away_rating)
+
+    print("Tier Bonus")
+    home_rating += details["tier"]["home"]
+    away_rating += details["tier"]["away"]
+    print(f"- {home}: {details['tier']['home']:+.2f}")
+    print(f"- {away}: {details['tier']['away']:+.2f}")
+    _print_ratings("Ratings after Tier", home, away, home_rating, away_rating)
 
     print("Rivalry Check")
-    rb = rivalry_bonus(home, away)
-    draw_boost = 0
-    if rb:
+    rivalry = details["rivalry"]
+    if features["rivalry"]:
         print("Rivalry detected — increasing draw % and boosting underdog.")
-        draw_boost = rb["draw_boost"]
-
-        if home_rating > away_rating:
-            away_rating += rb["underdog"]
-            print(f"   Underdog boost → {away} +{rb['underdog']}")
+        if rivalry["away"]:
+            print(f"   Underdog boost → {away} +{rivalry['away']}")
         else:
-            home_rating += rb["underdog"]
-            print(f"   Underdog boost → {home} +{rb['underdog']}")
+            print(f"   Underdog boost → {home} +{rivalry['home']}")
     else:
         print("No rivalry.\n")
-
-    print(f"➡ Ratings after rivalry:")
-    print(f"   {home}: {home_rating:.3f}")
-    print(f"   {away}: {away_rating:.3f}\n")
+    home_rating += rivalry["home"]
+    away_rating += rivalry["away"]
+    _print_ratings("Ratings after rivalry", home, away, home_rating, away_rating)
 
     print("Head-to-Head Influence (last 5)")
-    h2h_data = get_head_to_head(match["id"])
-
-    home_h2h, away_h2h = compute_h2h_boost(h2h_data, home_id=hid, away_id=aid)
-
-    home_rating += home_h2h
-    away_rating += away_h2h
-
-    print(f"- {home} H2H boost: {home_h2h:+.3f}")
-    print(f"- {away} H2H boost: {away_h2h:+.3f}")
-
-    print(f"➡ Ratings after H2H:")
-    print(f"   {home}: {home_rating:.3f}")
-    print(f"   {away}: {away_rating:.3f}\n")
+    home_rating += details["h2h"]["home"]
+    away_rating += details["h2h"]["away"]
+    print(f"- {home} H2H boost: {details['h2h']['home']:+.3f}")
+    print(f"- {away} H2H boost: {details['h2h']['away']:+.3f}")
+    _print_ratings("Ratings after H2H", home, away, home_rating, away_rating)
 
     print("Last 5 H2H Matches:")
-    if h2h_data and "matches" in h2h_data:
-        for m in h2h_data["matches"][:5]:
-            date = m.get("utcDate", "")[:10]
-            hteam = m["homeTeam"]["name"]
-            ateam = m["awayTeam"]["name"]
-            score = m["score"]["fullTime"]
-            gh = score.get("home")
-            ga = score.get("away")
-
-            # Determine winner label
-            if gh is not None and ga is not None:
-                if gh > ga:
-                    result = f"{hteam} WON"
-                elif ga > gh:
-                    result = f"{ateam} WON"
-                else:
-                    result = "DRAW"
-            else:
-                result = "Unknown result"
-
-            print(f"  {date}: {hteam} {gh}-{ga} {ateam} → {result}")
+    if details["h2h_lines"]:
+        for line in details["h2h_lines"]:
+            print(f"  {line}")
     else:
         print("  No H2H data available.")
 
     print("League Table Influence")
-    standings = get_current_standings()
-    table_bias_reason = "No table-based boost applied."
-
-    if home in standings and away in standings:
-        home_pos = standings[home]["position"]
-        away_pos = standings[away]["position"]
-
-        print(f"- {home}: position {home_pos}")
-        print(f"- {away}: position {away_pos}")
-
-        pos_diff = abs(home_pos - away_pos)
-
-        # Eligible table zones
-        european_zone = range(1, 9)     # 1–8
-        relegation_zone = range(16, 21) # 16–20
-
-        # Check if both teams are in the SAME competitive zone
-        same_zone = (
-            (home_pos in european_zone and away_pos in european_zone) or
-            (home_pos in relegation_zone and away_pos in relegation_zone)
-        )
-
-        if same_zone and 2 <= pos_diff <= 3:
-            # Apply underdog boost only in these zones
-            if home_pos > away_pos:
-                home_rating += 0.05  # much smaller boost
-                table_bias_reason = f"{home} boosted (+0.05): lower-ranked inside competitive zone."
-            else:
-                away_rating += 0.05
-                table_bias_reason = f"{away} boosted (+0.05): lower-ranked inside competitive zone."
-
-            print("Table competitive-zone underdog bias applied.")
-
-        elif 2 <= pos_diff <= 3:
-            # Apply smaller boost if not in same zone
-            if home_pos > away_pos:
-                home_rating += 0.03
-                table_bias_reason = f"{home} boosted (+0.03): lower-ranked but outside competitive zone."
+    table = details["table"]
+    if result.quality.in_table:
+        print(f"- {home}: position {table['home_pos']}")
+        print(f"- {away}: position {table['away_pos']}")
+        if table["home"] or table["away"]:
+            if table_bias(table["home_pos"], table["away_pos"])[2]:
+                print("Table competitive-zone underdog bias applied.")
             else:
-                away_rating += 0.03
-                table_bias_reason = f"{away} boosted (+0.03): lower-ranked but outside competitive zone."
-
-            print("table underdog bias applied (outside competitive zone).")
+                print("table underdog bias applied (outside competitive zone).")
         else:
             print("No table bias applied: teams not in same competitive zone or too far apart.")
-
     else:
         print("Standings unavailable.")
-
-    print("➡", table_bias_reason)
-    print(f"➡ Ratings after table:")
-    print(f"   {home}: {home_rating:.3f}")
-    print(f"   {away}: {away_rating:.3f}\n")
+    home_rating += table["home"]
+    away_rating += table["away"]
+    print("➡", table["reason"])
+    _print_ratings("Ratings after table", home, away, home_rating, away_rating)
+
+    congestion = features.get("congestion")
+    if congestion is not None:
+        print("Fixture Congestion (all competitions)")
+        for side, name in (("home", home), ("away", away)):
+            rest_days = congestion[f"{side}_rest_days"]
+            rest = f"{rest_days:.1f} days rest" if rest_days is not None else "rest unknown"
+            print(f"- {name}: {rest}, {congestion[f'{side}_recent_matches']} matches in 14 days → "
+                  f"{details['congestion'][side]:+.3f}")
+        home_rating += details["congestion"]["home"]
+        away_rating += details["congestion"]["away"]
+        _print_ratings("Ratings after congestion", home, away, home_rating, away_rating)
 
     print("Convert Ratings → Probabilities")
-    p_home, p_draw, p_away = ratings_to_probs(home_rating, away_rating, draw_boost)
-    print(f"- Home win: {p_home*100:.1f}%")
-    print(f"- Draw:     {p_draw*100:.1f}%")
-    print(f"- Away win: {p_away*100:.1f}%\n")
+    raw = result.raw_probabilities
+    if raw is not None:
+        print(f"- Raw: {raw.home*100:.1f}% / {raw.draw*100:.1f}% / {raw.away*100:.1f}% (before calibration)")
+    p = result.probabilities
+    print(f"- Home win: {p.home*100:.1f}%")
+    print(f"- Draw:     {p.draw*100:.1f}%")
+    print(f"- Away win: {p.away*100:.1f}%\n")
+
+    intervals = result.intervals
+    if intervals:
+        print(f"{intervals['level']*100:.0f}% intervals ({bootstrap} resamples)")
+        for label, key in (("Home win", "home"), ("Draw", "draw"), ("Away win", "away")):
+            lo, hi = intervals[key]
+            print(f"- {label + ':':<9} {lo*100:.1f}% – {hi*100:.1f}%")
+        print()
+
+    print(f"Prediction: {result.prediction}")
+    print("============================================================\n")
+
 
+# The prediction shown and stored for a fixture: "X Win" or "Draw", or a double chance ("X OR Draw",
+# "Draw OR X") when the favourite is within 5 points of the draw or, with intervals, overlaps it.
+def make_prediction_text(home, away, p_home, p_draw, p_away, intervals=None):
     homeP, drawP, awayP = p_home*100, p_draw*100, p_away*100
     winner_prob = max(homeP, drawP, awayP)
     
     prediction_text = "Unknown"
 
-    if abs(winner_prob - drawP) <= 5:
+    # With intervals, a favourite that cannot be separated from the draw is also a double chance
+    uncertain = False
+    if intervals and winner_prob != drawP:
+        favourite = "home" if winner_prob == homeP else "away"
+        uncertain = intervals["draw"][1] >= intervals[favourite][0]
+
+    if abs(winner_prob - drawP) <= 5 or uncertain:
         if winner_prob == homeP:
             prediction_text = f"{home} OR Draw"
         elif winner_prob == awayP:
@@ -540,16 +882,45 @@ def predict_match(match):
             prediction_text = f"{away} Win"
         else:
             prediction_text = "Draw"
-
-    print(f"Prediction: {prediction_text}")
-    print("============================================================\n")
-    return home_rating, away_rating, p_home, p_draw, p_away, prediction_text
+    return prediction_text
 
 
 if __name__ == "__main__":
+    if SNAPSHOT_PATH:
+        enable_snapshot(SNAPSHOT_PATH)
     conn = init_db()
     print("League Predictions")
 
+    rating_fn = None
+    if ELO_SEASONS:
+        print(f"Replaying seasons {ELO_SEASONS} into Elo ratings...")
+        rating_fn = elo_rating_fn(build_elo_state(ELO_SEASONS))
+
+    stats_fn = None
+    if FORM_SEASONS:
+        print(f"Loading seasons {FORM_SEASONS} into the form index...")
+        stats_fn = form_stats_fn(build_form_index(FORM_SEASONS), FORM_WINDOW, FORM_HALF_LIFE)
+
+    standings_fn = None
+    if STANDINGS_SEASON:
+        print(f"Building the league table from season {STANDINGS_SEASON} results...")
+        standings_fn = local_standings_fn(build_standings_state(STANDINGS_SEASON))
+
+    congestion_fn = None
+    if SCHEDULE_DAYS:
+        print(f"Indexing matches in all competitions over the last {SCHEDULE_DAYS} days...")
+        congestion_fn = schedule_congestion_fn(build_schedule_index(SCHEDULE_DAYS))
+
+    calibrate_fn = None
+    if CALIBRATE:
+        from calibration import load_calibration, calibration_fn
+        model = load_calibration(conn, "LEAGUE")
+        if model:
+            print(f"Applying {model['method']} calibration.")
+            calibrate_fn = calibration_fn(model)
+        else:
+            print("No calibration fitted yet (python calibration.py --fit); using raw probabilities.")
+
     while True:
         upcoming = get_upcoming_LEAGUE_fixtures(20)
 
@@ -562,8 +933,15 @@ if __name__ == "__main__":
         pick = pick_fixture(len(upcoming))
         match = upcoming[pick - 1]
 
-        h_rat, a_rat, p_h, p_d, p_a, p_text = predict_match(match)
-        save_prediction_to_db(conn, match, h_rat, a_rat, p_h, p_d, p_a, p_text)
+        result = analyse_match(match, rating_fn, stats_fn, standings_fn, BOOTSTRAP_RESAMPLES, calibrate_fn,
+                               congestion_fn)
+        p = result.probabilities
+        saved = save_prediction_to_db(conn, match, result.home_rating, result.away_rating, p.home, p.draw, p.away,
+                                      result.prediction, result.details, REVISE_PREDICTIONS)
+        if saved and SHADOW_MODELS:
+            # numpy is only loaded when shadow models are registered
+            from shadow import record_shadow
+            record_shadow(conn, match, result.details, SHADOW_MODELS)
 
         cont = input("\nPredict another? (y/n): ").strip().lower()
         if cont != 'y':
@@ -0,0 +1,256 @@
+import argparse
+import contextlib
+import json
+import math
+import sys
+import time
+from datetime import datetime, timezone
+
+from footballpredictions import DB_PATH, init_db, fetch_json
+
+
+# Live in-play probabilities for every match in progress.
+# One matches?status=IN_PLAY,PAUSED request per poll covers all tracked competitions, however many matches are live.
+# Each match's pre-match probabilities (from the ratings stored by predict_match) are turned into expected goals for
+# each side; during the match the goals still to come are Poisson with those rates scaled to the time remaining,
+# and added to the current score. Every change of score, minute or status is written as a new version of the
+# match in the live_probabilities table and streamed to stdout.
+
+# Competitions to follow; an empty tuple follows every competition the API key covers
+LIVE_COMPETITIONS = ("LEAGUE",)
+
+# The free tier allows 10 requests a minute; one poll is one request
+POLL_SECONDS = 60
+MIN_POLL_SECONDS = 6
+
+# Regulation time plus typical stoppage time, and the least time left that is ever assumed
+MATCH_MINUTES = 94
+MIN_REMAINING_MINUTES = 1
+
+# Half-time break, used to estimate the minute when the API does not give one
+HALF_TIME_BREAK_MINUTES = 15
+
+# Goals per side beyond which the Poisson tails are ignored
+MAX_GOALS = 10
+
+# Bounds for the expected total goals fitted to the pre-match probabilities
+MIN_TOTAL_GOALS = 0.5
+MAX_TOTAL_GOALS = 6.0
+
+
+def _poisson_pmf(rate):
+    pmf = [math.exp(-rate)]
+    for k in range(1, MAX_GOALS + 1):
+        pmf.append(pmf[-1] * rate / k)
+    return pmf
+
+
+# Probabilities of home win, draw and away win when each side still scores Poisson(rate) goals on top of the
+# current lead (home goals minus away goals).
+def outcome_probs(home_rate, away_rate, lead=0):
+    home_pmf = _poisson_pmf(home_rate)
+    away_pmf = _poisson_pmf(away_rate)
+    p_home = p_draw = p_away = 0.0
+    for i, ph in enumerate(home_pmf):
+        for j, pa in enumerate(away_pmf):
+            margin = lead + i - j
+            if margin > 0:
+                p_home += ph * pa
+            elif margin == 0:
+                p_draw += ph * pa
+            else:
+                p_away += ph * pa
+    total = p_home + p_draw + p_away
+    return p_home / total, p_draw / total, p_away / total
+
+
+# Splits total expected goals so the Poisson win probabilities differ by the same amount as the pre-match ones.
+def _split_goals(total, target_diff):
+    lo, hi = -total, total
+    for _ in range(40):
+        supremacy = (lo + hi) / 2
+        p_home, _, p_away = outcome_probs((total + supremacy) / 2, (total - supremacy) / 2)
+        if p_home - p_away < target_diff:
+            lo = supremacy
+        else:
+            hi = supremacy
+    supremacy = (lo + hi) / 2
+    return (total + supremacy) / 2, (total - supremacy) / 2
+
+
+# Expected full-match goals (home, away) reproducing the pre-match probabilities: the total sets the draw
+# probability (fewer goals, more draws) and the split sets home against away. Draw probabilities outside what
+# a Poisson match can give are matched as closely as the total goal bounds allow.
+def goal_rates(p_home, p_draw, p_away):
+    lo, hi = MIN_TOTAL_GOALS, MAX_TOTAL_GOALS
+    for _ in range(30):
+        total = (lo + hi) / 2
+        rates = _split_goals(total, p_home - p_away)
+        if outcome_probs(*rates)[1] > p_draw:
+            lo = total
+        else:
+            hi = total
+    return _split_goals((lo + hi) / 2, p_home - p_away)
+
+
+# Current minute of a live match. Uses the API's minute when it is given, otherwise estimates it from kickoff,
+# allowing for the half-time break. A paused match is taken to be at half time.
+def match_minute(match, now=None):
+    if match.get("status") == "PAUSED":
+        return 45
+    minute = match.get("minute")
+    if minute is not None:
+        try:
+            return int(str(minute).split("+")[0]) + int(match.get("injuryTime") or 0)
+        except ValueError:
+            pass
+    now = now or datetime.now(timezone.utc)
+    kickoff = datetime.strptime(match["utcDate"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    elapsed = (now - kickoff).total_seconds() / 60
+    if elapsed > 45 + HALF_TIME_BREAK_MINUTES:
+        elapsed -= HALF_TIME_BREAK_MINUTES
+    return max(0, min(int(elapsed), 90))
+
+
+# Live probabilities from the full-match goal rates, the score and the minute.
+def live_probs(rates, home_goals, away_goals, minute):
+    remaining = max(MATCH_MINUTES - minute, MIN_REMAINING_MINUTES) / MATCH_MINUTES
+    home_rate, away_rate = rates
+    return outcome_probs(home_rate * remaining, away_rate * remaining, home_goals - away_goals)
+
+
+def _ensure_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS live_probabilities
+                    (match_id INTEGER, version INTEGER, updated_at TEXT, status TEXT, minute INTEGER,
+                     home_goals INTEGER, away_goals INTEGER, home_prob REAL, draw_prob REAL, away_prob REAL,
+                     PRIMARY KEY (match_id, version))''')
+    conn.commit()
+
+
+# One request for every live match of the tracked competitions. The API's debug line goes to stderr so stdout
+# stays a clean stream of updates.
+def get_live_matches(competitions=LIVE_COMPETITIONS):
+    params = {"status": "IN_PLAY,PAUSED"}
+    if competitions:
+        params["competitions"] = ",".join(competitions)
+    # Straight to the API: live scores must never come from the warm-start snapshot
+    with contextlib.redirect_stdout(sys.stderr):
+        data = fetch_json("matches", params)
+    if not data:
+        return None
+    return data.get("matches", [])
+
+
+# Tracks the live matches between polls: goal rates fitted once per match, and the last version written.
+def new_live_state(conn):
+    _ensure_table(conn)
+    return {"rates": {}, "last": {}, "missing": set()}
+
+
+# Fits goal rates for matches seen for the first time, from their latest stored pre-match prediction, and
+# picks up the last version already written (so a restarted run continues the numbering).
+def _prepare(conn, state, match_ids):
+    new_ids = [mid for mid in match_ids if mid not in state["rates"] and mid not in state["missing"]]
+    if not new_ids:
+        return
+    marks = ", ".join("?" * len(new_ids))
+    c = conn.execute(f'''SELECT match_id, home_prob, draw_prob, away_prob FROM predictions
+                         WHERE rowid IN (SELECT MAX(rowid) FROM predictions
+                                         WHERE match_id IN ({marks}) GROUP BY match_id)''', new_ids)
+    for match_id, p_home, p_draw, p_away in c.fetchall():
+        state["rates"][match_id] = goal_rates(p_home, p_draw, p_away)
+    c = conn.execute(f'''SELECT match_id, version, status, minute, home_goals, away_goals FROM live_probabilities
+                         WHERE (match_id, version) IN (SELECT match_id, MAX(version) FROM live_probabilities
+                                                       WHERE match_id IN ({marks}) GROUP BY match_id)''', new_ids)
+    for match_id, version, *key in c.fetchall():
+        state["last"][match_id] = (version, tuple(key))
+    for match_id in new_ids:
+        if match_id not in state["rates"]:
+            state["missing"].add(match_id)
+            print(f"WARNING: no pre-match prediction stored for match {match_id}; skipping it", file=sys.stderr)
+
+
+# Updates the probabilities of every live match and writes a new version for each match whose score, minute or
+# status changed since the last one. Returns the updates written, as dicts.
+def update_live(conn, state, matches, now=None):
+    now = now or datetime.now(timezone.utc)
+    _prepare(conn, state, [m["id"] for m in matches])
+
+    updates = []
+    for m in matches:
+        rates = state["rates"].get(m["id"])
+        if rates is None:
+            continue
+        score = m.get("score", {}).get("fullTime", {})
+        home_goals = score.get("home") or 0
+        away_goals = score.get("away") or 0
+        minute = match_minute(m, now)
+        key = (m.get("status"), minute, home_goals, away_goals)
+        version, last_key = state["last"].get(m["id"], (0, None))
+        if key == last_key:
+            continue
+
+        p_home, p_draw, p_away = live_probs(rates, home_goals, away_goals, minute)
+        version += 1
+        state["last"][m["id"]] = (version, key)
+        updates.append({
+            "match_id": m["id"],
+            "version": version,
+            "updated_at": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "status": m.get("status"),
+            "minute": minute,
+            "home_team": m["homeTeam"]["name"],
+            "away_team": m["awayTeam"]["name"],
+            "home_goals": home_goals,
+            "away_goals": away_goals,
+            "home_prob": round(p_home, 4),
+            "draw_prob": round(p_draw, 4),
+            "away_prob": round(p_away, 4)
+        })
+
+    conn.executemany('''INSERT INTO live_probabilities VALUES
+                        (:match_id, :version, :updated_at, :status, :minute, :home_goals, :away_goals,
+                         :home_prob, :draw_prob, :away_prob)''', updates)
+    conn.commit()
+    return updates
+
+
+def format_update(u):
+    return (f"{u['minute']:>2}' {u['home_team']} {u['home_goals']}-{u['away_goals']} {u['away_team']} | "
+            f"{u['home_prob']*100:5.1f}% {u['draw_prob']*100:5.1f}% {u['away_prob']*100:5.1f}%"
+            f"{' (HT)' if u['status'] == 'PAUSED' else ''}")
+
+
+# Polls until interrupted (or once), streaming every update. A match that finishes simply drops out of the feed;
+# its result is picked up by reconcile.py.
+def run_live(conn, competitions=LIVE_COMPETITIONS, interval=POLL_SECONDS, once=False, as_json=False):
+    state = new_live_state(conn)
+    try:
+        while True:
+            matches = get_live_matches(competitions)
+            if matches is not None:
+                for u in update_live(conn, state, matches):
+                    print(json.dumps(u) if as_json else format_update(u), flush=True)
+            if once:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream live in-play probabilities for matches in progress.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--competitions", default=",".join(LIVE_COMPETITIONS),
+                        help="comma-separated competition codes; empty for all")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="seconds between polls")
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    parser.add_argument("--json", action="store_true", help="one JSON object per line")
+    args = parser.parse_args()
+
+    if args.interval < MIN_POLL_SECONDS:
+        print(f"Interval raised to {MIN_POLL_SECONDS}s to stay within the API rate limit.", file=sys.stderr)
+    conn = init_db(args.db)
+    competitions = tuple(code for code in args.competitions.split(",") if code)
+    run_live(conn, competitions, max(args.interval, MIN_POLL_SECONDS), args.once, args.json)
+    conn.close()
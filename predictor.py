@@ -0,0 +1,443 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import footballpredictions as fp
+
+
+# Embeddable, thread-safe version of predict_match for use inside other services and worker pools.
+# Configuration and the API client are passed in instead of read from module globals. predict() runs
+# predict_fixture, the model predict_match prints its steps from, and returns the Prediction. Failed API calls raise
+# ApiError instead of silently falling back to defaults. Missing but valid data, such as a short history or a team
+# that is not in the table, is reported in Prediction.quality.
+#
+# One Predictor can be shared by any number of threads. Venue histories, standings and H2H responses are cached per
+# instance for cache_ttl seconds. When several threads need the same response at once, only one of them fetches it.
+
+
+class PredictorError(Exception):
+    pass
+
+
+class InvalidMatchError(PredictorError, ValueError):
+    pass
+
+
+class ApiError(PredictorError):
+    def __init__(self, message, url=None, status_code=None):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+
+
+class RateLimitError(ApiError):
+    def __init__(self, message, url=None, status_code=429, retry_after=None):
+        super().__init__(message, url, status_code)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class PredictorConfig:
+    api_key: str
+    base_url: str = fp.BASE_URL
+    timeout: float = fp.REQUEST_TIMEOUT
+    competition: str = "LEAGUE"
+    big_teams: frozenset = frozenset()
+    mid_teams: frozenset = frozenset()
+    low_teams: frozenset = frozenset()
+    rivalries: dict = field(default_factory=dict)
+    venue_limit: int = 20
+    h2h_limit: int = 5
+    bootstrap: int = 0
+    cache_ttl: float = 15 * 60
+    # Entries kept per cache (venue histories, standings, H2H); the oldest are dropped beyond it
+    cache_size: int = 1024
+    # Venue histories shorter than this are flagged in the data quality
+    min_history: int = 5
+
+    # The configuration in footballpredictions.py.
+    @classmethod
+    def from_globals(cls, **overrides):
+        values = {
+            "api_key": fp.API_KEY,
+            "big_teams": frozenset(fp.BIG_TEAMS),
+            "mid_teams": frozenset(fp.MID_TEAMS),
+            "low_teams": frozenset(fp.LOW_TEAMS),
+            "rivalries": {home: frozenset(aways) for home, aways in fp.RIVALRIES.items()},
+            "bootstrap": fp.BOOTSTRAP_RESAMPLES
+        }
+        values.update(overrides)
+        return cls(**values)
+
+
+@dataclass(frozen=True)
+class Probabilities:
+    home: float
+    draw: float
+    away: float
+
+    @property
+    def most_likely(self):
+        return fp.predicted_outcome(self.home, self.draw, self.away)
+
+
+# A rating change for each side; the base entry holds the ratings the adjustments start from.
+@dataclass(frozen=True)
+class Adjustment:
+    home: float
+    away: float
+
+
+@dataclass(frozen=True)
+class DataQuality:
+    # Venue matches the stats were computed from; None when a rating or stats model supplied them
+    home_matches: int = None
+    away_matches: int = None
+    h2h_matches: int = 0
+    in_table: bool = False
+    warnings: tuple = ()
+
+    @property
+    def complete(self):
+        return not self.warnings
+
+
+@dataclass(frozen=True)
+class Prediction:
+    match_id: int
+    home_team: str
+    away_team: str
+    utc_date: str
+    probabilities: Probabilities
+    home_rating: float
+    away_rating: float
+    # base, tier, rivalry, h2h, table and congestion, in the order they are applied
+    adjustments: dict
+    draw_boost: float
+    prediction: str
+    quality: DataQuality
+    raw_probabilities: Probabilities = None
+    intervals: dict = None
+    # The rating breakdown and H2H lines, for save_prediction_to_db and report.py
+    details: dict = None
+
+    @property
+    def predicted_outcome(self):
+        return self.probabilities.most_likely
+
+
+# Fields of a match that predict_fixture cannot do without; utcDate is also needed when congestion is scored
+_REQUIRED_FIELDS = ("id", "homeTeam.id", "homeTeam.name", "awayTeam.id", "awayTeam.name")
+
+
+def _check_match(match, fields):
+    for field in fields:
+        value = match
+        for key in field.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is None:
+            raise InvalidMatchError(f"Match is missing {field}")
+
+
+# The model: rates one fixture (a match dict as returned by the API) and returns a Prediction, without printing.
+# Both Predictor.predict and footballpredictions.predict_match run it, with their own data sources:
+# venue_fn(team_id, venue) returns a team's finished matches at a venue, table_fn() the current standings and
+# h2h_fn(match_id) the head-to-head response (or None). The hooks are those of predict_match, and config supplies
+# the tiers, rivalries, bootstrap resamples and min_history. Raises InvalidMatchError for a malformed match;
+# errors raised by the data sources are passed on.
+def predict_fixture(match, config, venue_fn, table_fn, h2h_fn, rating_fn=None, stats_fn=None, standings_fn=None,
+                    calibrate_fn=None, congestion_fn=None):
+    _check_match(match, _REQUIRED_FIELDS + (("utcDate",) if congestion_fn is not None else ()))
+    match_id = match["id"]
+    home, hid = match["homeTeam"]["name"], match["homeTeam"]["id"]
+    away, aid = match["awayTeam"]["name"], match["awayTeam"]["id"]
+    warnings = []
+    home_window = away_window = None
+    home_count = away_count = None
+    home_stats = away_stats = None
+
+    if rating_fn is not None:
+        home_rating = rating_fn(hid, True)
+        away_rating = rating_fn(aid, False)
+    elif stats_fn is not None:
+        home_stats = stats_fn(hid, "HOME")
+        away_stats = stats_fn(aid, "AWAY")
+    else:
+        home_matches = venue_fn(hid, "HOME")
+        away_matches = venue_fn(aid, "AWAY")
+        home_stats = fp.compute_home_away_stats(home_matches, hid)
+        away_stats = fp.compute_home_away_stats(away_matches, aid)
+        home_count, away_count = len(home_matches), len(away_matches)
+        for name, venue, count in ((home, "home", home_count), (away, "away", away_count)):
+            if count < config.min_history:
+                warnings.append(f"{name} has only {count} {venue} matches")
+        if config.bootstrap:
+            from bootstrap import venue_goals
+            home_window = venue_goals(home_matches, hid)
+            away_window = venue_goals(away_matches, aid)
+    if rating_fn is None:
+        home_rating = fp.compute_home_away_rating(home_stats, is_home=True)
+        away_rating = fp.compute_home_away_rating(away_stats, is_home=False)
+
+    details = {
+        "base": {"home": home_rating, "away": away_rating},
+        "tier": {"home": 0, "away": 0},
+        "rivalry": {"home": 0, "away": 0, "draw_boost": 0},
+        "h2h": {"home": 0, "away": 0},
+        "table": {"home": 0, "away": 0, "home_pos": None, "away_pos": None, "reason": ""},
+        "congestion": {"home": 0, "away": 0},
+        "h2h_lines": [],
+        "features": {
+            "home_stats": home_stats if rating_fn is None else None,
+            "away_stats": away_stats if rating_fn is None else None,
+            "base": {"home": home_rating, "away": away_rating} if rating_fn is not None else None,
+            "rivalry": False,
+            "h2h": {"home_wins": 0, "away_wins": 0},
+            "table": {"home_pos": None, "away_pos": None}
+        }
+    }
+
+    tiers = (config.big_teams, config.mid_teams, config.low_teams)
+    home_tier = fp.team_tier_bonus(home, *tiers)
+    away_tier = fp.team_tier_bonus(away, *tiers)
+    home_rating += home_tier
+    away_rating += away_tier
+    details["tier"] = {"home": home_tier, "away": away_tier}
+
+    rb = fp.rivalry_bonus(home, away, config.rivalries)
+    details["features"]["rivalry"] = rb is not None
+    draw_boost = 0
+    if rb:
+        draw_boost = rb["draw_boost"]
+        details["rivalry"]["draw_boost"] = draw_boost
+        if home_rating > away_rating:
+            away_rating += rb["underdog"]
+            details["rivalry"]["away"] = rb["underdog"]
+        else:
+            home_rating += rb["underdog"]
+            details["rivalry"]["home"] = rb["underdog"]
+
+    h2h_data = h2h_fn(match_id)
+    home_h2h, away_h2h = fp.compute_h2h_boost(h2h_data, hid, aid)
+    home_wins, away_wins = fp.compute_h2h_wins(h2h_data, hid, aid)
+    home_rating += home_h2h
+    away_rating += away_h2h
+    details["h2h"] = {"home": home_h2h, "away": away_h2h}
+    details["features"]["h2h"] = {"home_wins": home_wins, "away_wins": away_wins}
+    h2h_matches = (h2h_data or {}).get("matches", [])[:5]
+    if h2h_matches:
+        details["h2h_lines"] = fp.format_h2h_lines(h2h_data)
+    else:
+        warnings.append("no head-to-head matches")
+
+    standings = standings_fn(match.get("utcDate")) if standings_fn is not None else table_fn()
+    in_table = home in standings and away in standings
+    details["table"]["reason"] = "No table-based boost applied."
+    if in_table:
+        home_pos = standings[home]["position"]
+        away_pos = standings[away]["position"]
+        home_table, away_table, same_zone = fp.table_bias(home_pos, away_pos)
+        home_rating += home_table
+        away_rating += away_table
+        details["table"] = {
+            "home": home_table,
+            "away": away_table,
+            "home_pos": home_pos,
+            "away_pos": away_pos,
+            "reason": fp.describe_table_bias(home, away, home_table, away_table, same_zone)
+        }
+        details["features"]["table"] = {"home_pos": home_pos, "away_pos": away_pos}
+    else:
+        warnings.append("teams not found in the standings")
+
+    if congestion_fn is not None:
+        home_c = congestion_fn(hid, match["utcDate"])
+        away_c = congestion_fn(aid, match["utcDate"])
+        home_rating += home_c["adjustment"]
+        away_rating += away_c["adjustment"]
+        details["congestion"] = {"home": home_c["adjustment"], "away": away_c["adjustment"]}
+        details["features"]["congestion"] = {
+            "home_rest_days": home_c["rest_days"],
+            "away_rest_days": away_c["rest_days"],
+            "home_recent_matches": home_c["recent_matches"],
+            "away_recent_matches": away_c["recent_matches"]
+        }
+
+    p_home, p_draw, p_away = fp.ratings_to_probs(home_rating, away_rating, draw_boost)
+    raw = None
+    if calibrate_fn is not None:
+        raw = Probabilities(p_home, p_draw, p_away)
+        details["raw_probs"] = {"home": p_home, "draw": p_draw, "away": p_away}
+        p_home, p_draw, p_away = calibrate_fn(p_home, p_draw, p_away)
+
+    intervals = None
+    if config.bootstrap:
+        from bootstrap import h2h_results, bootstrap_intervals
+        intervals = bootstrap_intervals(home_window, away_window, h2h_results(h2h_data, hid, aid), details,
+                                        config.bootstrap, calibrate_fn=calibrate_fn)
+        details["intervals"] = intervals
+
+    adjustments = {name: Adjustment(details[name]["home"], details[name]["away"])
+                   for name in ("base", "tier", "rivalry", "h2h", "table", "congestion")}
+    return Prediction(
+        match_id=match_id,
+        home_team=home,
+        away_team=away,
+        utc_date=match.get("utcDate"),
+        probabilities=Probabilities(p_home, p_draw, p_away),
+        home_rating=home_rating,
+        away_rating=away_rating,
+        adjustments=adjustments,
+        draw_boost=draw_boost,
+        prediction=fp.make_prediction_text(home, away, p_home, p_draw, p_away, intervals),
+        quality=DataQuality(home_count, away_count, len(h2h_matches), in_table, tuple(warnings)),
+        raw_probabilities=raw,
+        intervals=intervals,
+        details=details
+    )
+
+
+# football-data.org client raising typed errors. Each thread gets its own HTTP session.
+class HttpClient:
+    def __init__(self, api_key, base_url=fp.BASE_URL, timeout=fp.REQUEST_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            session.headers["X-Auth-Token"] = self.api_key
+            self._local.session = session
+        return session
+
+    def get_json(self, endpoint, params=None):
+        import requests
+        url = self.base_url + endpoint
+        try:
+            resp = self._session().get(url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ApiError(f"Request failed: {e}", url) from e
+        if resp.status_code == 429:
+            reset = resp.headers.get("X-RequestCounter-Reset") or resp.headers.get("Retry-After")
+            raise RateLimitError("API rate limit reached", url,
+                                 retry_after=float(reset) if reset and reset.isdigit() else None)
+        if resp.status_code >= 400:
+            raise ApiError(f"HTTP {resp.status_code}", url, resp.status_code)
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise ApiError("Response is not JSON", url, resp.status_code) from e
+
+
+# Thread-safe cache with expiry. A value missing from the cache is loaded by one thread while the others asking
+# for the same key wait for it; the key's lock is dropped once the load is over. Errors are not cached.
+# Entries are kept oldest first, so expired ones are evicted from the front whenever a value is stored, and at most
+# max_size are kept. Memory stays bounded however many keys (e.g. H2H match ids) a long-running service sees.
+class _Cache:
+    def __init__(self, ttl, max_size=1024):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loading = {}
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self._ttl:
+            return entry
+        return None
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        self._entries[key] = (now, value)
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if len(self._entries) <= self._max_size and now - oldest[0] < self._ttl:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key, load):
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                return entry[1]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                with self._lock:
+                    entry = self._fresh(key)
+                if entry is not None:
+                    return entry[1]
+                value = load()
+                with self._lock:
+                    self._store(key, value)
+                return value
+        finally:
+            with self._lock:
+                if self._loading.get(key) is key_lock:
+                    del self._loading[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Predictor:
+    # client needs a get_json(endpoint, params) method; by default an HttpClient for config.api_key.
+    # rating_fn, stats_fn, standings_fn, calibrate_fn and congestion_fn are the same hooks predict_match takes
+    # (Elo, the form index, the local table, calibration and the schedule index); they must be thread-safe.
+    def __init__(self, config=None, client=None, rating_fn=None, stats_fn=None, standings_fn=None,
+                 calibrate_fn=None, congestion_fn=None):
+        self.config = config if config is not None else PredictorConfig.from_globals()
+        self.client = client if client is not None else HttpClient(self.config.api_key, self.config.base_url,
+                                                                   self.config.timeout)
+        self.rating_fn = rating_fn
+        self.stats_fn = stats_fn
+        self.standings_fn = standings_fn
+        self.calibrate_fn = calibrate_fn
+        self.congestion_fn = congestion_fn
+        self._venue_cache = _Cache(self.config.cache_ttl, self.config.cache_size)
+        self._standings_cache = _Cache(self.config.cache_ttl, self.config.cache_size)
+        self._h2h_cache = _Cache(self.config.cache_ttl, self.config.cache_size)
+
+    def clear_cache(self):
+        for cache in (self._venue_cache, self._standings_cache, self._h2h_cache):
+            cache.clear()
+
+    # The team's finished league matches at one venue (HOME/AWAY), oldest first.
+    def venue_matches(self, team_id, venue):
+        def load():
+            data = self.client.get_json(f"teams/{team_id}/matches", {
+                "status": "FINISHED",
+                "competitions": self.config.competition,
+                "venue": venue,
+                "limit": self.config.venue_limit
+            })
+            return (data or {}).get("matches", [])
+        return self._venue_cache.get((team_id, venue), load)
+
+    # {team name: {position, points, goal_diff}}; empty if the API has no table for the competition.
+    def standings(self):
+        def load():
+            data = self.client.get_json(f"competitions/{self.config.competition}/standings")
+            if not data or not data.get("standings"):
+                return {}
+            return fp.parse_standings(data)
+        return self._standings_cache.get(self.config.competition, load)
+
+    def head_to_head(self, match_id):
+        return self._h2h_cache.get(match_id, lambda: self.client.get_json(
+            f"matches/{match_id}/head2head", {"limit": self.config.h2h_limit}))
+
+    # Predicts one fixture (a match dict as returned by the API). Raises InvalidMatchError for a malformed match
+    # and ApiError (or RateLimitError) when a request fails.
+    def predict(self, match):
+        return predict_fixture(match, self.config, self.venue_matches, self.standings, self.head_to_head,
+                               self.rating_fn, self.stats_fn, self.standings_fn, self.calibrate_fn,
+                               self.congestion_fn)
@@ -0,0 +1,190 @@
+import argparse
+import json
+import sys
+from datetime import date, timedelta
+
+from footballpredictions import DB_PATH, init_db
+
+
+# Filtered, paginated reads over the predictions table, for dashboards and the command line.
+# Pages are cut with keyset pagination on (date, rowid): the cursor is the last row's position, so every page is an
+# index range scan that starts where the previous one stopped, however deep into the results it is.
+# The composite indexes behind each filter are created in init_db.
+
+PAGE_SIZE = 50
+
+COLUMNS = ("match_id", "date", "competition", "matchday", "home_team", "away_team",
+           "home_prob", "draw_prob", "away_prob", "prediction", "predicted_outcome",
+           "outcome", "home_goals", "away_goals")
+
+OUTCOMES = ("HOME", "DRAW", "AWAY")
+
+
+# Cursors are "<date>|<rowid>" strings, so they can be passed around in URLs and on the command line.
+def encode_cursor(row_date, rowid):
+    return f"{row_date}|{rowid}"
+
+
+def decode_cursor(cursor):
+    row_date, _, rowid = cursor.rpartition("|")
+    if not row_date or not rowid.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return row_date, int(rowid)
+
+
+# date_to is inclusive: a plain YYYY-MM-DD covers every kickoff on that day.
+def _date_to_bound(date_to):
+    if len(date_to) == 10:
+        return "<", (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+    return "<=", date_to
+
+
+# Builds the WHERE conditions for every filter except team. Returns (clauses, params).
+# min_prob applies to the probability of the predicted (most likely) outcome.
+def _where(competition=None, matchday=None, date_from=None, date_to=None, predicted_outcome=None, min_prob=None):
+    clauses = []
+    params = []
+    if competition is not None:
+        clauses.append("competition = ?")
+        params.append(competition)
+    if matchday is not None:
+        clauses.append("matchday = ?")
+        params.append(matchday)
+    if date_from is not None:
+        clauses.append("date >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        op, bound = _date_to_bound(date_to)
+        clauses.append(f"date {op} ?")
+        params.append(bound)
+    if predicted_outcome is not None:
+        if predicted_outcome not in OUTCOMES:
+            raise ValueError(f"predicted_outcome must be one of {OUTCOMES}, not {predicted_outcome!r}")
+        clauses.append("predicted_outcome = ?")
+        params.append(predicted_outcome)
+    if min_prob is not None:
+        clauses.append("max(home_prob, draw_prob, away_prob) >= ?")
+        params.append(min_prob)
+    return clauses, params
+
+
+# Returns (rows, next_cursor) for one page of predictions matching the filters, oldest kickoff first
+# (newest_first reverses it). rows are dicts of columns (COLUMNS by default, date always included);
+# next_cursor is None on the last page.
+# Filters: team (home or away), competition, matchday, date_from/date_to (YYYY-MM-DD or ISO timestamps),
+# predicted_outcome (HOME/DRAW/AWAY) and min_prob.
+def query_predictions(conn, limit=PAGE_SIZE, after=None, newest_first=False, team=None, columns=COLUMNS,
+                      **filters):
+    if "date" not in columns:
+        columns = ("date",) + tuple(columns)
+    clauses, params = _where(**filters)
+    if after is not None:
+        clauses.append(f"(date, rowid) {'<' if newest_first else '>'} (?, ?)")
+        params += list(decode_cursor(after))
+
+    # One extra row tells whether another page follows
+    direction = "DESC" if newest_first else "ASC"
+    order = f"ORDER BY date {direction}, rowid {direction} LIMIT ?"
+    select = f"SELECT rowid AS rid, {', '.join(columns)} FROM predictions"
+
+    if team is None:
+        sql = select + (" WHERE " + " AND ".join(clauses) if clauses else "") + " " + order
+        params += [limit + 1]
+    else:
+        # A team filter is two index range scans, home and away, each cut to one page before they are merged;
+        # a plain OR would collect and sort every match of the team on every page.
+        branches = []
+        branch_params = []
+        for side in ("home_team", "away_team"):
+            where = " AND ".join([f"{side} = ?"] + clauses)
+            branches.append(f"SELECT * FROM ({select} WHERE {where} {order})")
+            branch_params += [team] + params + [limit + 1]
+        sql = " UNION ALL ".join(branches) + " " + order.replace("rowid", "rid")
+        params = branch_params + [limit + 1]
+
+    c = conn.cursor()
+    c.execute(sql, params)
+    fetched = c.fetchall()
+
+    rows = [dict(zip(columns, values[1:])) for values in fetched[:limit]]
+    next_cursor = None
+    if len(fetched) > limit:
+        last = fetched[limit - 1]
+        next_cursor = encode_cursor(last[columns.index("date") + 1], last[0])
+    return rows, next_cursor
+
+
+# Yields every matching prediction, one page at a time, so memory stays flat however many rows match
+# and no read transaction is held open between pages.
+def iter_predictions(conn, page_size=PAGE_SIZE, after=None, newest_first=False, **filters):
+    while True:
+        rows, after = query_predictions(conn, page_size, after, newest_first, **filters)
+        yield from rows
+        if after is None:
+            return
+
+
+# Number of predictions matching the filters, without reading them. With a team, the home and away counts are
+# taken separately (one index range each) and added, as a team never plays itself.
+def count_predictions(conn, team=None, **filters):
+    clauses, params = _where(**filters)
+    if team is None:
+        sql = "SELECT COUNT(*) FROM predictions" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+        return conn.execute(sql, params).fetchone()[0]
+    total = 0
+    for side in ("home_team", "away_team"):
+        sql = "SELECT COUNT(*) FROM predictions WHERE " + " AND ".join([f"{side} = ?"] + clauses)
+        total += conn.execute(sql, [team] + params).fetchone()[0]
+    return total
+
+
+def format_row(row):
+    probs = f"{row['home_prob']*100:5.1f}% {row['draw_prob']*100:5.1f}% {row['away_prob']*100:5.1f}%"
+    result = ""
+    if row["outcome"]:
+        result = f" | {row['home_goals']}-{row['away_goals']} ({row['outcome']})"
+    return (f"{(row['date'] or '')[:16]:<16} {row['competition'] or '':<6} MD{row['matchday'] or '?':<3} "
+            f"{row['home_team']} vs {row['away_team']} | {probs} | {row['prediction']}{result}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query stored predictions.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--team", help="home or away team name")
+    parser.add_argument("--competition")
+    parser.add_argument("--matchday", type=int)
+    parser.add_argument("--date-from", help="YYYY-MM-DD")
+    parser.add_argument("--date-to", help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--predicted", choices=OUTCOMES, help="most likely outcome")
+    parser.add_argument("--min-prob", type=float, help="minimum probability of the most likely outcome, e.g. 0.6")
+    parser.add_argument("--limit", type=int, default=PAGE_SIZE, help="rows per page")
+    parser.add_argument("--after", help="cursor printed at the end of the previous page")
+    parser.add_argument("--newest-first", action="store_true")
+    parser.add_argument("--all", action="store_true", help="stream every matching row instead of one page")
+    parser.add_argument("--count", action="store_true", help="print the number of matching rows and exit")
+    parser.add_argument("--json", action="store_true", help="one JSON object per line")
+    args = parser.parse_args()
+
+    filters = {"team": args.team, "competition": args.competition, "matchday": args.matchday,
+               "date_from": args.date_from, "date_to": args.date_to,
+               "predicted_outcome": args.predicted, "min_prob": args.min_prob}
+
+    conn = init_db(args.db)
+    if args.count:
+        count = count_predictions(conn, **filters)
+        print(json.dumps({"count": count}) if args.json else count)
+        conn.close()
+        sys.exit(0)
+
+    next_cursor = None
+    if args.all:
+        rows = iter_predictions(conn, args.limit, args.after, args.newest_first, **filters)
+    else:
+        rows, next_cursor = query_predictions(conn, args.limit, args.after, args.newest_first, **filters)
+
+    for row in rows:
+        print(json.dumps(row) if args.json else format_row(row))
+
+    if next_cursor:
+        print(f"\nMore results: --after '{next_cursor}'", file=sys.stderr if args.json else sys.stdout)
+    conn.close()
@@ -0,0 +1,222 @@
+import argparse
+import math
+from datetime import datetime, timezone
+
+from footballpredictions import SHADOW_MODELS, init_db, get_competition_matches
+
+
+# Reconciles stored predictions against final results and scores their accuracy.
+# All finished results for a competition and date window come from a single competitions/{code}/matches call,
+# are written with one bulk UPDATE, and the summary is rebuilt from one SELECT over the reconciled rows.
+
+# Every score also carries a rolling value: over this many most recent matchdays for matchday and league rows,
+# and over the team's most recent matches for team rows
+ROLLING_MATCHDAYS = 5
+ROLLING_TEAM_MATCHES = 5
+
+# Keeps log-loss finite when a stored probability was rounded to 0
+LOG_LOSS_EPS = 1e-15
+
+OUTCOMES = ("HOME", "DRAW", "AWAY")
+
+
+# Returns HOME, DRAW or AWAY for a finished match, or None if the result is not available yet.
+def match_outcome(match):
+    score = match.get("score", {})
+    winner = score.get("winner")
+    if winner == "HOME_TEAM":
+        return "HOME"
+    if winner == "AWAY_TEAM":
+        return "AWAY"
+    if winner == "DRAW":
+        return "DRAW"
+
+    full = score.get("fullTime", {})
+    gh = full.get("home")
+    ga = full.get("away")
+    if gh is None or ga is None:
+        return None
+    if gh > ga:
+        return "HOME"
+    if ga > gh:
+        return "AWAY"
+    return "DRAW"
+
+
+# Writes outcomes and final scores onto every stored prediction for the given matches in one bulk statement.
+# Returns the number of prediction rows updated.
+def reconcile_results(conn, matches):
+    rows = []
+    for m in matches:
+        outcome = match_outcome(m)
+        if outcome is None:
+            continue
+        full = m["score"]["fullTime"]
+        rows.append((m["id"], outcome, full.get("home"), full.get("away")))
+
+    c = conn.cursor()
+    c.execute('''CREATE TEMP TABLE IF NOT EXISTS reconcile_results
+                 (match_id INTEGER PRIMARY KEY, outcome TEXT, home_goals INTEGER, away_goals INTEGER)''')
+    c.execute("DELETE FROM reconcile_results")
+    c.executemany("INSERT OR REPLACE INTO reconcile_results VALUES (?, ?, ?, ?)", rows)
+    c.execute('''UPDATE predictions SET
+                     outcome = (SELECT r.outcome FROM reconcile_results r WHERE r.match_id = predictions.match_id),
+                     home_goals = (SELECT r.home_goals FROM reconcile_results r WHERE r.match_id = predictions.match_id),
+                     away_goals = (SELECT r.away_goals FROM reconcile_results r WHERE r.match_id = predictions.match_id)
+                 WHERE match_id IN (SELECT match_id FROM reconcile_results)''')
+    updated = c.rowcount
+    conn.commit()
+    return updated
+
+
+# Checks a double-chance text ("X OR Draw" / "Draw OR X") against the outcome.
+# Returns None for single-outcome predictions so they do not count towards the hit rate.
+def double_chance_hit(prediction, home_team, away_team, outcome):
+    if not prediction or " OR " not in prediction:
+        return None
+    covered = {"DRAW"}
+    for side in prediction.split(" OR "):
+        if side == home_team:
+            covered.add("HOME")
+        elif side == away_team:
+            covered.add("AWAY")
+    return outcome in covered
+
+
+# Log-loss, Brier score and whether the most likely outcome was right, for one prediction and its outcome.
+def prediction_scores(p_home, p_draw, p_away, outcome):
+    probs = {"HOME": p_home, "DRAW": p_draw, "AWAY": p_away}
+    log_loss = -math.log(max(probs[outcome], LOG_LOSS_EPS))
+    brier = sum((probs[o] - (1 if o == outcome else 0)) ** 2 for o in OUTCOMES)
+    correct = int(max(OUTCOMES, key=lambda o: probs[o]) == outcome)
+    return log_loss, brier, correct
+
+
+def _new_totals():
+    return {"n": 0, "log_loss": 0.0, "brier": 0.0, "correct": 0, "dc_n": 0, "dc_hits": 0}
+
+
+def _add(totals, log_loss, brier, correct, dc_hit):
+    totals["n"] += 1
+    totals["log_loss"] += log_loss
+    totals["brier"] += brier
+    totals["correct"] += correct
+    if dc_hit is not None:
+        totals["dc_n"] += 1
+        totals["dc_hits"] += dc_hit
+
+
+# Rolling (log_loss, brier, accuracy) over the ROLLING_MATCHDAYS matchdays up to md of a competition.
+def _rolling_matchdays(matchdays, comp, md):
+    window = _new_totals()
+    for prev in range(md - ROLLING_MATCHDAYS + 1, md + 1):
+        t = matchdays.get((comp, prev))
+        if t:
+            for key in window:
+                window[key] += t[key]
+    return _metrics(window)[1:4]
+
+
+# Rolling (log_loss, brier, accuracy) over a team's last ROLLING_TEAM_MATCHES scores, given oldest first.
+def _rolling_matches(scores):
+    recent = scores[-ROLLING_TEAM_MATCHES:]
+    return tuple(sum(s[i] for s in recent) / len(recent) for i in range(3))
+
+
+def _metrics(totals):
+    n = totals["n"]
+    return (
+        n,
+        totals["log_loss"] / n,
+        totals["brier"] / n,
+        totals["correct"] / n,
+        totals["dc_n"],
+        totals["dc_hits"] / totals["dc_n"] if totals["dc_n"] else None
+    )
+
+
+# Rebuilds the accuracy_summary table (per league, team and matchday) from all reconciled predictions.
+# Log-loss and Brier use the stored three-way probabilities; accuracy counts the most likely outcome;
+# the hit rate only covers double-chance texts. Rolling values cover the last ROLLING_MATCHDAYS matchdays (up to the
+# row's matchday, or the league's latest) and a team's last ROLLING_TEAM_MATCHES matches; a league without
+# matchdays has none. Returns the league-level rows.
+def compute_accuracy_summary(conn):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS accuracy_summary
+                 (scope TEXT, competition TEXT, key TEXT, n INTEGER,
+                  log_loss REAL, brier REAL, accuracy REAL, dc_n INTEGER, dc_hit_rate REAL,
+                  rolling_log_loss REAL, rolling_brier REAL, rolling_accuracy REAL, updated_at TEXT,
+                  PRIMARY KEY (scope, competition, key))''')
+
+    leagues = {}
+    teams = {}
+    team_scores = {}
+    matchdays = {}
+    latest_matchday = {}
+
+    # In kickoff order, so each team's scores end with its most recent matches
+    c.execute('''SELECT competition, matchday, home_team, away_team,
+                        home_prob, draw_prob, away_prob, prediction, outcome
+                 FROM predictions WHERE outcome IS NOT NULL ORDER BY date''')
+    for comp, md, home, away, p_home, p_draw, p_away, prediction, outcome in c:
+        comp = comp or "LEAGUE"
+        log_loss, brier, correct = prediction_scores(p_home, p_draw, p_away, outcome)
+        dc_hit = double_chance_hit(prediction, home, away, outcome)
+
+        _add(leagues.setdefault(comp, _new_totals()), log_loss, brier, correct, dc_hit)
+        for team in (home, away):
+            _add(teams.setdefault((comp, team), _new_totals()), log_loss, brier, correct, dc_hit)
+            team_scores.setdefault((comp, team), []).append((log_loss, brier, correct))
+        if md is not None:
+            _add(matchdays.setdefault((comp, md), _new_totals()), log_loss, brier, correct, dc_hit)
+            latest_matchday[comp] = max(latest_matchday.get(comp, md), md)
+
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    rows = []
+    for comp, totals in leagues.items():
+        rolling = (None, None, None)
+        if comp in latest_matchday:
+            rolling = _rolling_matchdays(matchdays, comp, latest_matchday[comp])
+        rows.append(("league", comp, comp) + _metrics(totals) + rolling + (now,))
+    for (comp, team), totals in teams.items():
+        rows.append(("team", comp, team) + _metrics(totals) + _rolling_matches(team_scores[(comp, team)]) + (now,))
+    for (comp, md), totals in matchdays.items():
+        rows.append(("matchday", comp, str(md)) + _metrics(totals) + _rolling_matchdays(matchdays, comp, md) + (now,))
+
+    c.execute("DELETE FROM accuracy_summary")
+    c.executemany("INSERT INTO accuracy_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return [r for r in rows if r[0] == "league"]
+
+
+# Fetches every finished result for the competition and window in one API call, reconciles and rescores.
+def reconcile(conn, competition="LEAGUE", date_from=None, date_to=None, season=None):
+    matches = get_competition_matches(competition, status="FINISHED", season=season,
+                                      date_from=date_from, date_to=date_to)
+    updated = reconcile_results(conn, matches)
+    print(f"Fetched {len(matches)} finished matches, reconciled {updated} predictions.")
+    return compute_accuracy_summary(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile stored predictions with final results and score them.")
+    parser.add_argument("--competition", default="LEAGUE")
+    parser.add_argument("--date-from", help="YYYY-MM-DD")
+    parser.add_argument("--date-to", help="YYYY-MM-DD")
+    parser.add_argument("--season", type=int, help="season start year, e.g. 2025")
+    args = parser.parse_args()
+
+    conn = init_db()
+    summary = reconcile(conn, args.competition, args.date_from, args.date_to, args.season)
+
+    for _, comp, _, n, log_loss, brier, accuracy, dc_n, dc_rate, *_ in summary:
+        dc_text = f"{dc_rate*100:.1f}% of {dc_n}" if dc_n else "n/a"
+        print(f"{comp}: {n} predictions | log-loss {log_loss:.3f} | Brier {brier:.3f} | "
+              f"accuracy {accuracy*100:.1f}% | double-chance hits {dc_text}")
+
+    if SHADOW_MODELS:
+        from shadow import compare_models, print_comparison
+        print("\nShadow models:")
+        print_comparison(compare_models(conn, args.competition))
+
+    conn.close()
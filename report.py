@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+
+from footballpredictions import DB_PATH, init_db
+from reconcile import double_chance_hit
+
+
+# Static matchday reports rendered from the predictions table: one HTML and/or Markdown page per competition and
+# matchday, with fixtures, probability bars, the rating breakdown from predict_match, recent H2H lines and, once
+# played, results versus predictions.
+# Builds are incremental: each page's prediction rows are content-hashed and compared with the manifest of the
+# previous build, so only pages whose rows changed are rendered again.
+
+REPORT_DIR = "reports"
+MANIFEST_FILE = ".manifest.json"
+
+# Bump when the page layout changes so every page is rendered again on the next build
+TEMPLATE_VERSION = 2
+
+FORMATS = ("html", "md")
+
+_COLUMNS = ("match_id", "date", "competition", "matchday", "home_team", "away_team",
+            "home_prob", "draw_prob", "away_prob", "home_rating", "away_rating", "prediction",
+            "outcome", "home_goals", "away_goals", "details")
+
+_CSS = """body{font-family:sans-serif;max-width:900px;margin:2em auto;color:#222}
+.fixture{border:1px solid #ddd;border-radius:6px;padding:1em;margin:1em 0}
+.bar{display:flex;height:22px;border-radius:4px;overflow:hidden;font-size:12px;color:#fff}
+.bar div{display:flex;align-items:center;justify-content:center;white-space:nowrap}
+.home{background:#2e7d32}.draw{background:#757575}.away{background:#1565c0}
+table{border-collapse:collapse;margin-top:.5em}td,th{padding:2px 10px;text-align:right}
+td:first-child,th:first-child{text-align:left}.hit{color:#2e7d32}.miss{color:#c62828}"""
+
+
+# Loads every prediction row grouped by (competition, matchday), ordered by kickoff.
+def load_matchdays(conn):
+    c = conn.cursor()
+    c.execute(f'''SELECT {", ".join(_COLUMNS)} FROM predictions
+                  ORDER BY competition, matchday, date, match_id''')
+    groups = {}
+    for values in c:
+        row = dict(zip(_COLUMNS, values))
+        row["details"] = json.loads(row["details"]) if row["details"] else None
+        key = (row["competition"] or "LEAGUE", row["matchday"])
+        groups.setdefault(key, []).append(row)
+    return groups
+
+
+def page_name(competition, matchday):
+    md = f"md{matchday:02d}" if matchday is not None else "md-unknown"
+    return f"{competition}/{md}"
+
+
+def content_hash(rows):
+    payload = json.dumps([TEMPLATE_VERSION, rows], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _most_likely(row):
+    probs = {"HOME": row["home_prob"], "DRAW": row["draw_prob"], "AWAY": row["away_prob"]}
+    return max(probs, key=probs.get)
+
+
+# Returns (score text, verdict text, hit) for a played match, or None if the result is not reconciled yet.
+def _result(row):
+    if not row["outcome"]:
+        return None
+    score = f"{row['home_team']} {row['home_goals']}-{row['away_goals']} {row['away_team']}"
+    dc_hit = double_chance_hit(row["prediction"], row["home_team"], row["away_team"], row["outcome"])
+    hit = dc_hit if dc_hit is not None else _most_likely(row) == row["outcome"]
+    verdict = f"Prediction \"{row['prediction']}\" {'correct' if hit else 'wrong'}"
+    return score, verdict, hit
+
+
+# Rows of (label, home, away) for the rating breakdown table, or [] when no breakdown was stored.
+def _breakdown_rows(details):
+    if not details:
+        return []
+    rows = [("Base rating", details["base"]["home"], details["base"]["away"])]
+    for label, key in (("Tier", "tier"), ("Rivalry", "rivalry"), ("H2H", "h2h"), ("Table", "table"),
+                       ("Congestion", "congestion")):
+        # Predictions saved before the congestion adjustment existed have no entry for it
+        if key in details:
+            rows.append((label, details[key]["home"], details[key]["away"]))
+    return rows
+
+
+def render_html(competition, matchday, rows):
+    title = f"{competition} — Matchday {matchday if matchday is not None else '?'}"
+    parts = [f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>",
+             f"<style>{_CSS}</style></head><body>",
+             f"<p><a href=\"../index.html\">All matchdays</a></p><h1>{html.escape(title)}</h1>"]
+
+    for row in rows:
+        home = html.escape(row["home_team"])
+        away = html.escape(row["away_team"])
+        parts.append(f"<div class=\"fixture\"><h2>{home} vs {away}</h2><p>{html.escape(row['date'] or '')}</p>")
+
+        parts.append("<div class=\"bar\">")
+        for cls, prob in (("home", row["home_prob"]), ("draw", row["draw_prob"]), ("away", row["away_prob"])):
+            parts.append(f"<div class=\"{cls}\" style=\"width:{prob*100:.1f}%\">{prob*100:.1f}%</div>")
+        parts.append("</div>")
+        parts.append(f"<p><b>Prediction:</b> {html.escape(row['prediction'] or '')}</p>")
+
+        result = _result(row)
+        if result:
+            score, verdict, hit = result
+            parts.append(f"<p><b>Result:</b> {html.escape(score)} — "
+                         f"<span class=\"{'hit' if hit else 'miss'}\">{html.escape(verdict)}</span></p>")
+
+        details = row["details"]
+        breakdown = _breakdown_rows(details)
+        if breakdown:
+            parts.append(f"<table><tr><th></th><th>{home}</th><th>{away}</th></tr>")
+            for label, h, a in breakdown:
+                parts.append(f"<tr><td>{label}</td><td>{h:+.3f}</td><td>{a:+.3f}</td></tr>")
+            parts.append(f"<tr><th>Final rating</th><th>{row['home_rating']:.3f}</th>"
+                         f"<th>{row['away_rating']:.3f}</th></tr></table>")
+            if details["table"]["reason"]:
+                parts.append(f"<p>{html.escape(details['table']['reason'])}</p>")
+            if details["h2h_lines"]:
+                parts.append("<p><b>Recent H2H</b></p><ul>")
+                parts.extend(f"<li>{html.escape(line)}</li>" for line in details["h2h_lines"])
+                parts.append("</ul>")
+        else:
+            parts.append("<p>No rating breakdown stored for this prediction.</p>")
+        parts.append("</div>")
+
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def _md_bar(prob, width=20):
+    filled = round(prob * width)
+    return "█" * filled + "░" * (width - filled)
+
+
+def render_markdown(competition, matchday, rows):
+    lines = [f"# {competition} — Matchday {matchday if matchday is not None else '?'}", ""]
+    for row in rows:
+        home = row["home_team"]
+        away = row["away_team"]
+        lines += [f"## {home} vs {away}", "", f"{row['date'] or ''}", "", "```"]
+        for label, prob in (("Home", row["home_prob"]), ("Draw", row["draw_prob"]), ("Away", row["away_prob"])):
+            lines.append(f"{label:<5} {_md_bar(prob)} {prob*100:5.1f}%")
+        lines += ["```", "", f"**Prediction:** {row['prediction']}", ""]
+
+        result = _result(row)
+        if result:
+            score, verdict, _ = result
+            lines += [f"**Result:** {score} — {verdict}", ""]
+
+        details = row["details"]
+        breakdown = _breakdown_rows(details)
+        if breakdown:
+            lines += [f"| | {home} | {away} |", "|---|---:|---:|"]
+            lines += [f"| {label} | {h:+.3f} | {a:+.3f} |" for label, h, a in breakdown]
+            lines += [f"| **Final rating** | **{row['home_rating']:.3f}** | **{row['away_rating']:.3f}** |", ""]
+            if details["table"]["reason"]:
+                lines += [details["table"]["reason"], ""]
+            if details["h2h_lines"]:
+                lines += ["**Recent H2H**", ""] + [f"- {line}" for line in details["h2h_lines"]] + [""]
+        else:
+            lines += ["_No rating breakdown stored for this prediction._", ""]
+    return "\n".join(lines)
+
+
+def render_index(pages, fmt):
+    if fmt == "html":
+        items = "".join(f"<li><a href=\"{p}.html\">{html.escape(p)}</a></li>" for p in pages)
+        return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Predictions</title>"
+                f"<style>{_CSS}</style></head><body><h1>Predictions</h1><ul>{items}</ul></body></html>")
+    return "\n".join(["# Predictions", ""] + [f"- [{p}]({p}.md)" for p in pages])
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# Renders every page whose rows changed since the last build (or whose files are missing) and the index.
+# Returns (rendered, skipped) page counts.
+def build_reports(conn, out_dir=REPORT_DIR, formats=FORMATS, force=False):
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    renderers = {"html": render_html, "md": render_markdown}
+    new_manifest = {}
+    rendered = skipped = 0
+
+    for (competition, matchday), rows in load_matchdays(conn).items():
+        name = page_name(competition, matchday)
+        digest = content_hash(rows)
+        paths = [os.path.join(out_dir, f"{name}.{fmt}") for fmt in formats]
+        if manifest.get(name) == digest and all(os.path.exists(p) for p in paths):
+            skipped += 1
+        else:
+            for fmt, path in zip(formats, paths):
+                _write(path, renderers[fmt](competition, matchday, rows))
+            rendered += 1
+        new_manifest[name] = digest
+
+    pages = sorted(new_manifest)
+    if rendered or pages != sorted(manifest):
+        for fmt in formats:
+            _write(os.path.join(out_dir, f"index.{fmt}"), render_index(pages, fmt))
+
+    _write(manifest_path, json.dumps(new_manifest, indent=1, sort_keys=True))
+    return rendered, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build static matchday reports from stored predictions.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", default=REPORT_DIR)
+    parser.add_argument("--format", choices=FORMATS, action="append",
+                        help="html and/or md (default: both)")
+    parser.add_argument("--force", action="store_true", help="render every page again")
+    args = parser.parse_args()
+
+    conn = init_db(args.db)
+    rendered, skipped = build_reports(conn, args.out, tuple(args.format or FORMATS), args.force)
+    conn.close()
+    print(f"Rendered {rendered} page(s), {skipped} unchanged.")
@@ -0,0 +1,113 @@
+import bisect
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+# Every team's matches across all competitions (league, cups, European games), as one sorted list of kickoff
+# times per team. Filled from the competition-wide matches feed and updated incrementally, so rest days and recent
+# match counts for any team and date are a bisect away, without calling the API per fixture.
+# Scheduled matches are indexed too: a cup tie played between the prediction and the kickoff still counts.
+
+# Matches that will not be played (or not at their date) are left out
+SKIPPED_STATUSES = {"POSTPONED", "CANCELLED", "SUSPENDED"}
+
+CONGESTION_WINDOW_DAYS = 14
+
+# Rating adjustment for fixture congestion: a penalty per day of rest short of FULL_REST_DAYS, and per match
+# beyond BUSY_MATCHES in the CONGESTION_WINDOW_DAYS before kickoff
+FULL_REST_DAYS = 4
+REST_PENALTY = 0.03
+BUSY_MATCHES = 3
+BUSY_PENALTY = 0.02
+
+
+def new_schedule_index():
+    return {"dates": {}, "matches": {}, "lock": threading.RLock()}
+
+
+def _parse(date):
+    return datetime.strptime(date, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+def _format(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _remove(index, match_id):
+    date, home_id, away_id = index["matches"].pop(match_id)
+    for team_id in (home_id, away_id):
+        dates = index["dates"][team_id]
+        del dates[bisect.bisect_left(dates, date)]
+
+
+# Adds or updates one match. A rescheduled match moves to its new date; a postponed or cancelled one is removed.
+# Returns True if the index changed.
+def add_match(index, match):
+    date = match.get("utcDate")
+    if not date:
+        return False
+    match_id = match["id"]
+    entry = (date, match["homeTeam"]["id"], match["awayTeam"]["id"])
+    skipped = match.get("status") in SKIPPED_STATUSES
+
+    with index["lock"]:
+        current = index["matches"].get(match_id)
+        if current == entry and not skipped:
+            return False
+        if current is not None:
+            _remove(index, match_id)
+        if skipped:
+            return current is not None
+        index["matches"][match_id] = entry
+        for team_id in entry[1:]:
+            bisect.insort(index["dates"].setdefault(team_id, []), date)
+    return True
+
+
+# Returns the number of matches that changed the index.
+def add_matches(index, matches):
+    changed = 0
+    for m in matches:
+        if add_match(index, m):
+            changed += 1
+    return changed
+
+
+# Days between the team's previous match and date (a utcDate), or None if none is indexed.
+def days_since_last(index, team_id, date):
+    with index["lock"]:
+        dates = index["dates"].get(team_id, [])
+        i = bisect.bisect_left(dates, date)
+        if i == 0:
+            return None
+        previous = dates[i - 1]
+    return (_parse(date) - _parse(previous)).total_seconds() / 86400
+
+
+# Number of the team's matches in the given number of days before date (not counting date itself).
+def matches_in_last(index, team_id, date, days=CONGESTION_WINDOW_DAYS):
+    start = _format(_parse(date) - timedelta(days=days))
+    with index["lock"]:
+        dates = index["dates"].get(team_id, [])
+        return bisect.bisect_left(dates, date) - bisect.bisect_left(dates, start)
+
+
+# Rating adjustment (zero or negative) for a team's rest days and recent matches.
+def congestion_adjustment(rest_days, recent_matches):
+    penalty = BUSY_PENALTY * max(0, recent_matches - BUSY_MATCHES)
+    if rest_days is not None:
+        penalty += REST_PENALTY * max(0.0, FULL_REST_DAYS - rest_days)
+    return 0.0 - penalty
+
+
+# Returns {rest_days, recent_matches, adjustment} for a team playing at date.
+def compute_congestion(index, team_id, date):
+    rest_days = days_since_last(index, team_id, date)
+    recent = matches_in_last(index, team_id, date)
+    return {"rest_days": rest_days, "recent_matches": recent, "adjustment": congestion_adjustment(rest_days, recent)}
+
+
+def congestion_fn(index):
+    def fn(team_id, date):
+        return compute_congestion(index, team_id, date)
+    return fn
@@ -0,0 +1,301 @@
+import argparse
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from footballpredictions import (
+    DB_PATH, ELO_SEASONS, FORM_SEASONS, FORM_WINDOW, FORM_HALF_LIFE, STANDINGS_SEASON, BOOTSTRAP_RESAMPLES,
+    SNAPSHOT_PATH, CALIBRATE, SCHEDULE_DAYS, SHADOW_MODELS, init_db, get_upcoming_LEAGUE_fixtures,
+    get_competition_matches, get_team_matches_by_venue, get_current_standings, get_head_to_head, predictor_config,
+    save_prediction_to_db, build_elo_state, build_form_index, build_standings_state, fetch_error_count,
+    reset_fetch_errors, enable_snapshot, build_schedule_index
+)
+from predictor import predict_fixture
+from elo_ratings import elo_rating_fn, replay_matches
+from team_form import form_stats_fn, add_matches
+from standings import standings_fn as local_standings_fn, add_results
+from schedule_index import congestion_fn as schedule_congestion_fn
+from snapshot import save_snapshot
+
+
+# Local scheduler daemon that predicts every upcoming fixture automatically, a set time before kickoff.
+# Jobs live in a SQLite queue and every state change is committed straight away, so a run that dies
+# (rate limit, timeout, laptop sleep) resumes exactly where it stopped on the next start.
+
+JOBS_DB_PATH = "LEAGUE_jobs.db"
+
+LEAD_TIME_HOURS = 24        # predict this long before kickoff
+MAX_WORKERS = 3             # bounded pool; keep low enough for the free API rate limit
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60     # doubled after every failed attempt
+RETRY_MAX_SECONDS = 3600
+POLL_SECONDS = 30
+ENQUEUE_EVERY_SECONDS = 3600
+FIXTURE_LIMIT = 50
+HISTORY_REFRESH_DAYS = 7     # finished results fetched on every queue refresh to keep Elo/form/table current
+
+
+def _utc_now():
+    return datetime.now(timezone.utc)
+
+
+# Same format as the API's utcDate, so run_at and kickoff compare correctly as text
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_iso(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+# Opens the job queue and puts back any job left running by a crashed or killed process.
+def init_jobs_db(db_path=JOBS_DB_PATH):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                 (match_id INTEGER PRIMARY KEY, competition TEXT, kickoff TEXT, run_at TEXT,
+                  status TEXT, attempts INTEGER, last_error TEXT, match_json TEXT, updated_at TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)")
+    c.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+    if c.rowcount:
+        print(f"Recovered {c.rowcount} interrupted job(s).")
+    conn.commit()
+    return conn
+
+
+# Adds one job per upcoming fixture. Existing jobs are left alone, except that pending jobs follow a
+# rescheduled kickoff, and a missed job whose match was moved to a later kickoff is queued again.
+# The fixture is stored with the job so a resumed job never refetches the fixture list.
+def enqueue_upcoming(conn, lead_time_hours=LEAD_TIME_HOURS, limit=FIXTURE_LIMIT):
+    fixtures = get_upcoming_LEAGUE_fixtures(limit)
+    now = _iso(_utc_now())
+    c = conn.cursor()
+    added = 0
+    for m in fixtures:
+        kickoff = m.get("utcDate")
+        if not kickoff:
+            continue
+        run_at = _iso(_parse_iso(kickoff) - timedelta(hours=lead_time_hours))
+        competition = m.get("competition", {}).get("code", "LEAGUE")
+        c.execute('''INSERT INTO jobs VALUES (?, ?, ?, ?, 'pending', 0, NULL, ?, ?)
+                     ON CONFLICT (match_id) DO UPDATE SET
+                         status = 'pending', kickoff = excluded.kickoff, run_at = excluded.run_at,
+                         match_json = excluded.match_json, updated_at = excluded.updated_at
+                     WHERE jobs.status IN ('pending', 'missed') AND jobs.kickoff != excluded.kickoff''',
+                  (m["id"], competition, kickoff, run_at, json.dumps(m), now))
+        added += c.rowcount
+    conn.commit()
+    print(f"Enqueued/updated {added} job(s) from {len(fixtures)} upcoming fixture(s).")
+    return added
+
+
+# Moves pending jobs whose kickoff has passed (e.g. the machine slept through it) to 'missed'. A prediction
+# made now could use the match's own result, so it is never run or saved as a pre-match prediction.
+def expire_missed_jobs(conn, now):
+    c = conn.execute('''UPDATE jobs SET status = 'missed', last_error = 'kickoff passed before the job ran',
+                            updated_at = ?
+                        WHERE status = 'pending' AND kickoff <= ?''', (now, now))
+    if c.rowcount:
+        print(f"⚠️ {c.rowcount} job(s) missed their kickoff and will not run.")
+    return c.rowcount
+
+
+# Atomically moves up to `limit` due jobs from pending to running and returns (match_id, match) pairs.
+# Only matches that have not kicked off yet are claimed.
+def claim_due_jobs(conn, limit):
+    if limit <= 0:
+        return []
+    now = _iso(_utc_now())
+    c = conn.cursor()
+    expire_missed_jobs(conn, now)
+    c.execute('''SELECT match_id, match_json FROM jobs
+                 WHERE status = 'pending' AND run_at <= ? AND kickoff > ?
+                 ORDER BY run_at LIMIT ?''', (now, now, limit))
+    claimed = []
+    for match_id, match_json in c.fetchall():
+        c.execute('''UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+                     WHERE match_id = ? AND status = 'pending' ''', (now, match_id))
+        if c.rowcount:
+            claimed.append((match_id, json.loads(match_json)))
+    conn.commit()
+    return claimed
+
+
+def mark_done(conn, match_id):
+    conn.execute("UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE match_id = ?",
+                 (_iso(_utc_now()), match_id))
+    conn.commit()
+
+
+# Puts a failed job back in the queue with exponential backoff, or marks it failed after MAX_ATTEMPTS.
+def mark_failed(conn, match_id, error):
+    now = _utc_now()
+    c = conn.cursor()
+    c.execute("SELECT attempts FROM jobs WHERE match_id = ?", (match_id,))
+    attempts = c.fetchone()[0]
+    if attempts >= MAX_ATTEMPTS:
+        c.execute("UPDATE jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE match_id = ?",
+                  (error, _iso(now), match_id))
+        print(f"❌ Job {match_id} failed after {attempts} attempts: {error}")
+    else:
+        delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+        c.execute('''UPDATE jobs SET status = 'pending', run_at = ?, last_error = ?, updated_at = ?
+                     WHERE match_id = ?''', (_iso(now + timedelta(seconds=delay)), error, _iso(now), match_id))
+        print(f"⚠️ Job {match_id} failed ({error}), retrying in {delay}s.")
+    conn.commit()
+
+
+# Runs one job on a worker thread and returns a one-line summary for the main loop to print, or None when the
+# fixture already has a stored prediction (that completes without any API call). The model runs silently, so
+# workers never interleave their output; a prediction built while any request failed is not saved but retried.
+def run_job(match, rating_fn=None, stats_fn=None, standings_fn=None, calibrate_fn=None, congestion_fn=None,
+            db_path=DB_PATH):
+    # The schema is migrated once by run_scheduler; workers only need their own connection
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        exists = conn.execute("SELECT 1 FROM predictions WHERE match_id = ?", (match["id"],)).fetchone()
+        if exists:
+            return
+
+        reset_fetch_errors()
+        result = predict_fixture(match, predictor_config(BOOTSTRAP_RESAMPLES), get_team_matches_by_venue,
+                                 get_current_standings, get_head_to_head, rating_fn, stats_fn, standings_fn,
+                                 calibrate_fn, congestion_fn)
+        if fetch_error_count():
+            raise RuntimeError(f"{fetch_error_count()} API request(s) failed")
+        p = result.probabilities
+        save_prediction_to_db(conn, match, result.home_rating, result.away_rating, p.home, p.draw, p.away,
+                              result.prediction, result.details, quiet=True)
+        if SHADOW_MODELS:
+            from shadow import record_shadow
+            record_shadow(conn, match, result.details, SHADOW_MODELS)
+        return (f"✅ {result.home_team} vs {result.away_team}: {result.prediction} "
+                f"(H {p.home:.2f} / D {p.draw:.2f} / A {p.away:.2f})")
+    finally:
+        conn.close()
+
+
+# Adds the latest finished results to the Elo state, form index and league table in one API call.
+# All of them ignore matches they already hold, so overlapping windows are safe. Each state applies its update
+# under its own lock; run_scheduler only calls this while no job is running.
+def refresh_history(elo_state, form_index, standings_state, days=HISTORY_REFRESH_DAYS):
+    if elo_state is None and form_index is None and standings_state is None:
+        return
+    today = _utc_now().date()
+    matches = get_competition_matches(status="FINISHED", date_from=str(today - timedelta(days=days)),
+                                      date_to=str(today))
+    if elo_state is not None:
+        replay_matches(elo_state, matches)
+    if form_index is not None:
+        add_matches(form_index, matches)
+    if standings_state is not None:
+        add_results(standings_state, matches)
+
+
+# Prints job counts per status, then the jobs that missed their kickoff.
+def print_status(conn):
+    expire_missed_jobs(conn, _iso(_utc_now()))
+    conn.commit()
+    for status, count in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status ORDER BY status"):
+        print(f"{status:>8}: {count}")
+    missed = conn.execute("SELECT match_id, kickoff FROM jobs WHERE status = 'missed' ORDER BY kickoff").fetchall()
+    if missed:
+        print("Missed (kickoff passed before the job ran):")
+        for match_id, kickoff in missed:
+            print(f"  {match_id} (kickoff {kickoff})")
+
+
+# Main loop: refresh the queue every ENQUEUE_EVERY_SECONDS, hand due jobs to a bounded worker pool and
+# record each result as soon as it completes. Once a refresh is due, no new job is handed out until the running
+# ones finish and the refresh is done, so every prediction sees one version of Elo, form and table together.
+# With once=True, runs every job that is already due and exits.
+# With a snapshot, it is also written after every queue refresh so a crash loses at most one cycle of responses.
+def run_scheduler(lead_time_hours=LEAD_TIME_HOURS, workers=MAX_WORKERS, once=False, snapshot=None):
+    conn = init_jobs_db()
+    db = init_db()
+    calibrate_fn = None
+    if CALIBRATE:
+        from calibration import load_calibration, calibration_fn
+        model = load_calibration(db, "LEAGUE")
+        calibrate_fn = calibration_fn(model) if model else None
+    db.close()
+    elo_state = build_elo_state(ELO_SEASONS) if ELO_SEASONS else None
+    form_index = build_form_index(FORM_SEASONS) if FORM_SEASONS else None
+    rating_fn = elo_rating_fn(elo_state) if elo_state is not None else None
+    stats_fn = form_stats_fn(form_index, FORM_WINDOW, FORM_HALF_LIFE) if form_index is not None else None
+    standings_state = build_standings_state(STANDINGS_SEASON) if STANDINGS_SEASON else None
+    standings_fn = local_standings_fn(standings_state) if standings_state is not None else None
+    schedule = build_schedule_index(SCHEDULE_DAYS) if SCHEDULE_DAYS else None
+    congestion_fn = schedule_congestion_fn(schedule) if schedule is not None else None
+
+    running = {}
+    last_enqueue = None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                refresh_due = last_enqueue is None or time.monotonic() - last_enqueue >= ENQUEUE_EVERY_SECONDS
+                if refresh_due and not running:
+                    refresh_history(elo_state, form_index, standings_state)
+                    if schedule is not None:
+                        # Picks up new cup draws and rescheduled matches; the index is updated in place
+                        build_schedule_index(HISTORY_REFRESH_DAYS, index=schedule)
+                    enqueue_upcoming(conn, lead_time_hours)
+                    last_enqueue = time.monotonic()
+                    if snapshot is not None:
+                        save_snapshot(snapshot)
+                    refresh_due = False
+
+                if not refresh_due:
+                    for match_id, match in claim_due_jobs(conn, workers - len(running)):
+                        running[match_id] = pool.submit(run_job, match, rating_fn, stats_fn, standings_fn,
+                                                        calibrate_fn, congestion_fn)
+
+                for match_id, future in list(running.items()):
+                    if not future.done():
+                        continue
+                    del running[match_id]
+                    error = future.exception()
+                    if error is None:
+                        mark_done(conn, match_id)
+                        if future.result():
+                            print(future.result())
+                    else:
+                        mark_failed(conn, match_id, str(error))
+
+                if once and not running:
+                    now = _iso(_utc_now())
+                    c = conn.execute('''SELECT 1 FROM jobs
+                                        WHERE status = 'pending' AND run_at <= ? AND kickoff > ? LIMIT 1''',
+                                     (now, now))
+                    if c.fetchone() is None:
+                        break
+
+                time.sleep(1 if running else POLL_SECONDS)
+        except KeyboardInterrupt:
+            # Unfinished jobs stay 'running' and are recovered on the next start
+            print("\nStopping scheduler...")
+
+    print_status(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run predictions automatically before each kickoff.")
+    parser.add_argument("--lead-hours", type=float, default=LEAD_TIME_HOURS,
+                        help="how long before kickoff to predict")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--once", action="store_true", help="run the jobs that are due now and exit")
+    parser.add_argument("--status", action="store_true", help="print the job queue and exit")
+    parser.add_argument("--snapshot", metavar="PATH", default=SNAPSHOT_PATH,
+                        help="keep API responses in this file between runs (warm start)")
+    args = parser.parse_args()
+
+    if args.status:
+        jobs_conn = init_jobs_db()
+        print_status(jobs_conn)
+        jobs_conn.close()
+    else:
+        snapshot = enable_snapshot(args.snapshot) if args.snapshot else None
+        run_scheduler(args.lead_hours, args.workers, args.once, snapshot)
@@ -0,0 +1,181 @@
+import argparse
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+import footballpredictions as fp
+from calibration import load_calibrations
+from reconcile import prediction_scores
+from vector_model import DEFAULT_PARAMS
+from whatif import calibrate, current_config, feature_arrays, is_calibrated, load_fixtures, score
+
+
+# Shadow evaluation of candidate model configurations. Each candidate is a set of vector_model params (weights of
+# compute_home_away_rating, team_tier_bonus, the H2H/table/congestion adjustments or ratings_to_probs), registered
+# under a model version in SHADOW_MODELS in footballpredictions.py.
+# Every saved production prediction is re-scored by all candidates from the inputs predict_match already fetched
+# (details["features"]), so a candidate costs no API call: fixtures and candidates are broadcast against each other
+# and scored in one numpy pass. Candidate probabilities go to the shadow_predictions table, one row per
+# (match_id, model_version); once reconcile.py has written the results they are compared with production on the
+# same matches.
+#
+# A fixture that production saved calibrated is calibrated for every candidate too, with its league's stored model,
+# so the comparison measures the candidates' params and not the calibration. If the league has no stored model at
+# the time, the candidates stay raw and are compared with production's raw probabilities from details.
+
+OUTCOMES = ("HOME", "DRAW", "AWAY")
+
+
+def _ensure_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS shadow_predictions
+                    (match_id INTEGER, model_version TEXT, home_prob REAL, draw_prob REAL, away_prob REAL,
+                     predicted_outcome TEXT, created_at TEXT, calibrated INTEGER,
+                     PRIMARY KEY (match_id, model_version))''')
+    # Tables created before calibration was applied to candidates hold raw probabilities (calibrated is NULL)
+    fp.ensure_columns(conn.cursor(), "shadow_predictions", {"calibrated": "INTEGER"})
+
+
+# Unknown param names would be silently ignored by vector_model, so they are rejected here.
+def _check_models(models):
+    for version, params in models.items():
+        unknown = set(params) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"Model {version!r} has unknown params {sorted(unknown)}; "
+                             f"expected some of {sorted(DEFAULT_PARAMS)}")
+
+
+# Scores fixtures (rows with match_id, competition, home_team, away_team, features and raw_probs, as from
+# whatif.load_fixtures) under every model in {version: params}, calibrating the ones production saved calibrated
+# with calibrations ({competition: model}). Returns {version: (p_home, p_draw, p_away)}, each an array over the
+# fixtures. Fixtures run along one axis and models along the other, so all of them are scored in a single pass.
+def score_models(rows, models, config=None, calibrations=None):
+    _check_models(models)
+    versions = list(models)
+    arrays = {key: value[np.newaxis, :] for key, value in feature_arrays(rows, config or current_config()).items()}
+    params = {name: np.array([models[v].get(name, default) for v in versions], dtype=float)[:, np.newaxis]
+              for name, default in DEFAULT_PARAMS.items()}
+    probs = (np.broadcast_to(p, (len(versions), len(rows))) for p in score(arrays, params))
+    p_home, p_draw, p_away = calibrate(rows, *probs, calibrations or {})
+    return {v: (p_home[i], p_draw[i], p_away[i]) for i, v in enumerate(versions)}
+
+
+# Writes the candidates' probabilities, replacing any earlier ones for the same (match_id, model_version).
+# calibrations are the models score_models calibrated with, recorded per row.
+def save_shadow_predictions(conn, rows, scores, calibrations=None):
+    _ensure_table(conn)
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    records = []
+    for version, (p_home, p_draw, p_away) in scores.items():
+        for i, row in enumerate(rows):
+            probs = (round(float(p_home[i]), 4), round(float(p_draw[i]), 4), round(float(p_away[i]), 4))
+            records.append((row["match_id"], version) + probs +
+                           (fp.predicted_outcome(*probs), now, int(is_calibrated(row, calibrations or {}))))
+    conn.executemany('''INSERT OR REPLACE INTO shadow_predictions
+                        (match_id, model_version, home_prob, draw_prob, away_prob, predicted_outcome, created_at,
+                         calibrated)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', records)
+    conn.commit()
+    return len(records)
+
+
+# Scores one just-predicted fixture under every candidate; called after save_prediction_to_db with the details
+# of its Prediction.
+def record_shadow(conn, match, details, models):
+    row = {
+        "match_id": match["id"],
+        "competition": match.get("competition", {}).get("code", "LEAGUE"),
+        "home_team": match["homeTeam"]["name"],
+        "away_team": match["awayTeam"]["name"],
+        "features": details["features"],
+        "raw_probs": details.get("raw_probs")
+    }
+    calibrations = load_calibrations(conn) if row["raw_probs"] is not None else None
+    return save_shadow_predictions(conn, [row], score_models([row], models, calibrations=calibrations), calibrations)
+
+
+# Scores stored predictions (selected with query.py filters) under the candidates, e.g. after registering a new one.
+def backfill(conn, models, **filters):
+    rows = load_fixtures(conn, **filters)
+    if not rows:
+        return 0
+    calibrations = load_calibrations(conn)
+    return save_shadow_predictions(conn, rows, score_models(rows, models, calibrations=calibrations), calibrations)
+
+
+# Log-loss, Brier score and accuracy of every model version on its reconciled matches, next to production's on
+# exactly the same matches and at the same calibration: a candidate scored raw is compared with production's raw
+# probabilities. Returns one dict per version, best log-loss first.
+def compare_models(conn, competition=None):
+    _ensure_table(conn)
+    sql = '''SELECT s.model_version, s.home_prob, s.draw_prob, s.away_prob,
+                    p.home_prob, p.draw_prob, p.away_prob, p.outcome,
+                    CASE WHEN COALESCE(s.calibrated, 0) = 0 THEN p.details END
+             FROM shadow_predictions s
+             JOIN predictions p ON p.match_id = s.match_id
+             WHERE p.outcome IS NOT NULL'''
+    params = []
+    if competition is not None:
+        sql += " AND p.competition = ?"
+        params.append(competition)
+
+    totals = {}
+    for version, s_home, s_draw, s_away, p_home, p_draw, p_away, outcome, details in conn.execute(sql, params):
+        raw = json.loads(details).get("raw_probs") if details else None
+        if raw:
+            # Rounded as stored, like the candidates'
+            p_home, p_draw, p_away = round(raw["home"], 4), round(raw["draw"], 4), round(raw["away"], 4)
+        t = totals.setdefault(version, np.zeros(7))
+        t += (1,) + prediction_scores(s_home, s_draw, s_away, outcome) + prediction_scores(p_home, p_draw, p_away,
+                                                                                           outcome)
+
+    report = []
+    for version, (n, log_loss, brier, correct, prod_log_loss, prod_brier, prod_correct) in totals.items():
+        report.append({
+            "model_version": version,
+            "n": int(n),
+            "log_loss": log_loss / n,
+            "brier": brier / n,
+            "accuracy": correct / n,
+            "production_log_loss": prod_log_loss / n,
+            "production_brier": prod_brier / n,
+            "production_accuracy": prod_correct / n
+        })
+    report.sort(key=lambda r: r["log_loss"])
+    return report
+
+
+def print_comparison(report):
+    if not report:
+        print("No reconciled shadow predictions yet.")
+        return
+    print(f"{'model':<20} {'n':>6} {'log-loss':>9} {'Δ prod':>8} {'Brier':>7} {'Δ prod':>8} {'accuracy':>9}")
+    for r in report:
+        print(f"{r['model_version']:<20} {r['n']:>6} {r['log_loss']:>9.4f} "
+              f"{r['log_loss'] - r['production_log_loss']:>+8.4f} {r['brier']:>7.4f} "
+              f"{r['brier'] - r['production_brier']:>+8.4f} {r['accuracy']*100:>8.1f}%")
+    print("Δ prod: difference from the production model on the same matches (negative is better).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare shadow model versions with production.")
+    parser.add_argument("--db", default=fp.DB_PATH)
+    parser.add_argument("--competition")
+    parser.add_argument("--backfill", action="store_true",
+                        help="score the stored predictions under every model in SHADOW_MODELS first")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    conn = fp.init_db(args.db)
+    if args.backfill:
+        if not fp.SHADOW_MODELS:
+            print("No shadow models registered; add them to SHADOW_MODELS in footballpredictions.py.")
+        else:
+            print(f"Stored {backfill(conn, fp.SHADOW_MODELS, competition=args.competition)} shadow predictions.")
+
+    report = compare_models(conn, args.competition)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_comparison(report)
+    conn.close()
@@ -0,0 +1,216 @@
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+
+# Warm-start cache of API responses, kept in one snapshot file between runs.
+# The file is a small header, a JSON index of {key: [offset, length, fetched_at, kind]} and one zlib-compressed JSON
+# blob per response. It is memory-mapped on startup, so only the index is read up front; each response is
+# decompressed the first time it is asked for.
+#
+# Every entry records when it was fetched. An entry older than its kind's TTL is still served straight away, and a
+# background thread fetches a fresh copy for the next read (and the next snapshot). Entries older than their kind's
+# MAX_AGE are fetched again before being returned, and dropped from the file when it is saved.
+
+SNAPSHOT_VERSION = 1
+MAGIC = b"FPSNAP"
+HEADER = struct.Struct("<6sHI")  # magic, version, index length
+
+# Seconds before an entry of each kind is refreshed in the background
+SNAPSHOT_TTL = {
+    "fixtures": 15 * 60,
+    "standings": 15 * 60,
+    "history": 60 * 60,
+    "season": 6 * 60 * 60,
+    "h2h": 24 * 60 * 60,
+    "other": 15 * 60,
+}
+
+# Seconds after which an entry of each kind is too old to serve at all. Kept short for data that predictions are
+# built from and that changes after every matchday, so a warm start never lists fixtures already played or
+# saves a prediction from an old table or venue history.
+MAX_AGE = {
+    "fixtures": 60 * 60,
+    "standings": 60 * 60,
+    "history": 6 * 60 * 60,
+    "season": 7 * 24 * 60 * 60,
+    "h2h": 7 * 24 * 60 * 60,
+    "other": 60 * 60,
+}
+
+
+def cache_key(endpoint, params=None):
+    return endpoint + ("?" + urlencode(sorted(params.items())) if params else "")
+
+
+# Groups endpoints by how quickly their data changes.
+def endpoint_kind(endpoint, params=None):
+    params = params or {}
+    if endpoint.endswith("/standings"):
+        return "standings"
+    if endpoint.endswith("/head2head"):
+        return "h2h"
+    if endpoint.startswith("teams/"):
+        return "history"
+    if endpoint.endswith("/matches"):
+        if params.get("status") == "SCHEDULED":
+            return "fixtures"
+        if params.get("status") == "FINISHED" and "season" in params:
+            return "season"
+    return "other"
+
+
+def new_snapshot(path):
+    return {
+        "path": path,
+        "file": None,
+        "mm": None,
+        "index": {},
+        "fresh": {},
+        "lock": threading.Lock(),
+        "refresh_queue": None,
+        "pending": set()
+    }
+
+
+# Maps an existing snapshot file and reads its index. A missing, unreadable or older-version file gives an
+# empty snapshot, so the run simply starts cold.
+def load_snapshot(path):
+    state = new_snapshot(path)
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return state
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        f.close()
+        return state
+
+    try:
+        magic, version, index_len = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot {magic!r} v{version}")
+        index = json.loads(mm[HEADER.size:HEADER.size + index_len])
+    except (struct.error, ValueError) as e:
+        print(f"WARNING: ignoring snapshot {path}: {e}")
+        mm.close()
+        f.close()
+        return state
+
+    base = HEADER.size + index_len
+    state["file"] = f
+    state["mm"] = mm
+    state["index"] = {key: (base + offset, length, fetched_at, kind)
+                      for key, (offset, length, fetched_at, kind) in index.items()}
+    return state
+
+
+# Returns (fetched_at, kind, compressed bytes) for a key, from this run's fetches or the mapped file.
+def _entry(state, key):
+    entry = state["fresh"].get(key)
+    if entry is not None:
+        return entry
+    mapped = state["index"].get(key)
+    if mapped is None:
+        return None
+    offset, length, fetched_at, kind = mapped
+    return fetched_at, kind, state["mm"][offset:offset + length]
+
+
+def _store(state, key, kind, data):
+    blob = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+    with state["lock"]:
+        state["fresh"][key] = (time.time(), kind, blob)
+
+
+def _refresh_worker(state):
+    while True:
+        key, endpoint, params, kind, fetch = state["refresh_queue"].get()
+        data = fetch(endpoint, params)
+        if data is not None:
+            _store(state, key, kind, data)
+        with state["lock"]:
+            state["pending"].discard(key)
+
+
+def _schedule_refresh(state, key, endpoint, params, kind, fetch):
+    with state["lock"]:
+        if key in state["pending"]:
+            return
+        state["pending"].add(key)
+        if state["refresh_queue"] is None:
+            state["refresh_queue"] = queue.Queue()
+            threading.Thread(target=_refresh_worker, args=(state,), daemon=True).start()
+    state["refresh_queue"].put((key, endpoint, params, kind, fetch))
+
+
+# Returns the response for endpoint/params from the snapshot, calling fetch(endpoint, params) only when it is
+# missing or older than its kind's MAX_AGE. Entries past their TTL are returned as they are and refreshed in the background.
+# Failed fetches (None) are not cached.
+def cached_json(state, endpoint, params, fetch):
+    key = cache_key(endpoint, params)
+    kind = endpoint_kind(endpoint, params)
+    with state["lock"]:
+        entry = _entry(state, key)
+
+    if entry is not None:
+        fetched_at, _, blob = entry
+        age = time.time() - fetched_at
+        if age <= MAX_AGE[kind]:
+            if age > SNAPSHOT_TTL[kind]:
+                _schedule_refresh(state, key, endpoint, params, kind, fetch)
+            return json.loads(zlib.decompress(blob))
+
+    data = fetch(endpoint, params)
+    if data is not None:
+        _store(state, key, kind, data)
+    return data
+
+
+def _close(state):
+    if state["mm"] is not None:
+        state["mm"].close()
+        state["file"].close()
+    state["mm"] = state["file"] = None
+
+
+# Writes every entry younger than its kind's MAX_AGE to the snapshot file and maps the new file. Entries that were not
+# refreshed are copied over still compressed. Safe to call repeatedly, e.g. on exit and periodically from a daemon.
+def save_snapshot(state):
+    now = time.time()
+    with state["lock"]:
+        entries = {}
+        for key in set(state["index"]) | set(state["fresh"]):
+            fetched_at, kind, blob = _entry(state, key)
+            if now - fetched_at <= MAX_AGE[kind]:
+                entries[key] = (fetched_at, kind, bytes(blob))
+
+        index = {}
+        offset = 0
+        for key, (fetched_at, kind, blob) in entries.items():
+            index[key] = [offset, len(blob), fetched_at, kind]
+            offset += len(blob)
+        index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+        tmp = state["path"] + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(index_bytes)))
+            f.write(index_bytes)
+            for _, _, blob in entries.values():
+                f.write(blob)
+
+        # The old file must be unmapped before it can be replaced on Windows
+        _close(state)
+        os.replace(tmp, state["path"])
+        reloaded = load_snapshot(state["path"])
+        for name in ("file", "mm", "index"):
+            state[name] = reloaded[name]
+        state["fresh"] = {}
+    return len(entries)
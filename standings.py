@@ -0,0 +1,239 @@
+import bisect
+import threading
+
+
+# League table computed locally from finished results and maintained incrementally, one result at a time.
+# A ranked snapshot is kept for every match date, so "table as of date D" is a bisect away, and the output has
+# the same {position, points, goal_diff} shape as get_current_standings.
+# Snapshots are ranked lazily on read, so reads and writes share a lock for use from worker threads.
+
+# Tiebreak order after points, per competition code. "h2h_*" criteria are evaluated in a mini-league between
+# the teams still tied at that point.
+TIEBREAK_RULES = {
+    "PL": ("goal_diff", "goals_for", "h2h_points", "h2h_goal_diff"),
+    "BL1": ("goal_diff", "goals_for", "h2h_points", "h2h_goal_diff"),
+    "FL1": ("goal_diff", "h2h_points", "h2h_goal_diff", "goals_for"),
+    "PD": ("h2h_points", "h2h_goal_diff", "goal_diff", "goals_for"),
+    "SA": ("h2h_points", "h2h_goal_diff", "goal_diff", "goals_for"),
+    "DED": ("goal_diff", "goals_for", "h2h_points", "h2h_goal_diff"),
+    "PPL": ("h2h_points", "h2h_goal_diff", "goal_diff", "goals_for"),
+}
+DEFAULT_TIEBREAKS = ("goal_diff", "goals_for")
+
+POINTS_WIN = 3
+POINTS_DRAW = 1
+
+
+def new_standings_state(competition="LEAGUE"):
+    return {
+        "competition": competition,
+        "tiebreaks": TIEBREAK_RULES.get(competition, DEFAULT_TIEBREAKS),
+        "teams": {},
+        "results": [],
+        "match_ids": set(),
+        "snapshot_dates": [],
+        "snapshots": [],
+        "matchday_dates": {},
+        "dirty": False,
+        "lock": threading.RLock()
+    }
+
+
+def _new_totals():
+    return {"played": 0, "won": 0, "drawn": 0, "lost": 0, "goals_for": 0, "goals_against": 0, "points": 0}
+
+
+# Makes a team appear in the table before it has played, e.g. from the season's fixture list.
+def register_team(state, name):
+    state["teams"].setdefault(name, _new_totals())
+
+
+def _apply(totals, gf, ga):
+    totals["played"] += 1
+    totals["goals_for"] += gf
+    totals["goals_against"] += ga
+    if gf > ga:
+        totals["won"] += 1
+        totals["points"] += POINTS_WIN
+    elif gf < ga:
+        totals["lost"] += 1
+    else:
+        totals["drawn"] += 1
+        totals["points"] += POINTS_DRAW
+
+
+# Points and goal difference from the results between the given teams only.
+def _mini_league(state, names):
+    mini = {n: {"h2h_points": 0, "h2h_goal_diff": 0} for n in names}
+    for _, home, away, gh, ga in state["results"]:
+        if home in mini and away in mini:
+            mini[home]["h2h_goal_diff"] += gh - ga
+            mini[away]["h2h_goal_diff"] += ga - gh
+            if gh > ga:
+                mini[home]["h2h_points"] += POINTS_WIN
+            elif ga > gh:
+                mini[away]["h2h_points"] += POINTS_WIN
+            else:
+                mini[home]["h2h_points"] += POINTS_DRAW
+                mini[away]["h2h_points"] += POINTS_DRAW
+    return mini
+
+
+def _criterion(state, names, criterion):
+    if criterion.startswith("h2h_"):
+        mini = _mini_league(state, names)
+        return {n: mini[n][criterion] for n in names}
+    if criterion == "goal_diff":
+        return {n: state["teams"][n]["goals_for"] - state["teams"][n]["goals_against"] for n in names}
+    return {n: state["teams"][n][criterion] for n in names}
+
+
+# Orders tied teams by the remaining criteria, recomputing head-to-head values within each tied group.
+def _break_ties(state, names, criteria):
+    if len(names) <= 1 or not criteria:
+        return sorted(names)
+    values = _criterion(state, names, criteria[0])
+    groups = {}
+    for n in names:
+        groups.setdefault(values[n], []).append(n)
+    ordered = []
+    for value in sorted(groups, reverse=True):
+        ordered.extend(_break_ties(state, groups[value], criteria[1:]))
+    return ordered
+
+
+# Ranks the current totals into {team: {position, points, goal_diff, ...}}.
+# Teams without a game yet are left out here and listed last by _with_unplayed.
+def rank_table(state):
+    criteria = ("points",) + tuple(state["tiebreaks"])
+    played = [name for name, t in state["teams"].items() if t["played"]]
+    order = _break_ties(state, played, criteria)
+    table = {}
+    for position, name in enumerate(order, start=1):
+        t = state["teams"][name]
+        table[name] = dict(t, position=position, goal_diff=t["goals_for"] - t["goals_against"])
+    return table
+
+
+# Stores the ranked table for the latest match date, replacing a snapshot already taken for that date.
+def _flush(state):
+    if not state["dirty"]:
+        return
+    day = state["results"][-1][0]
+    table = rank_table(state)
+    if state["snapshot_dates"] and state["snapshot_dates"][-1] == day:
+        state["snapshots"][-1] = table
+    else:
+        state["snapshot_dates"].append(day)
+        state["snapshots"].append(table)
+    state["dirty"] = False
+
+
+# Re-applies every result from `day` onwards, starting from the last snapshot taken before that day.
+def _rebuild_from(state, day):
+    idx = bisect.bisect_left(state["snapshot_dates"], day)
+    teams = list(state["teams"])
+    state["teams"] = {}
+    if idx > 0:
+        for name, row in state["snapshots"][idx - 1].items():
+            state["teams"][name] = {k: row[k] for k in _new_totals()}
+    for name in teams:
+        register_team(state, name)
+
+    start = bisect.bisect_left(state["results"], (day,))
+    replay = state["results"][start:]
+    del state["results"][start:]
+    del state["snapshot_dates"][idx:]
+    del state["snapshots"][idx:]
+    state["dirty"] = False
+    for result in replay:
+        _add(state, *result)
+    _flush(state)
+
+
+def _add(state, day, home, away, gh, ga):
+    if state["results"] and day > state["results"][-1][0]:
+        _flush(state)
+    register_team(state, home)
+    register_team(state, away)
+    _apply(state["teams"][home], gh, ga)
+    _apply(state["teams"][away], ga, gh)
+    state["results"].append((day, home, away, gh, ga))
+    state["dirty"] = True
+
+
+# Applies one finished match. Unfinished and already applied matches are ignored; a result older than the
+# latest match date (e.g. a rescheduled game reported late) rebuilds the snapshots from that point.
+# Returns True if the table changed.
+def add_result(state, match):
+    score = match.get("score", {}).get("fullTime", {})
+    gh = score.get("home")
+    ga = score.get("away")
+    if gh is None or ga is None or match.get("id") in state["match_ids"]:
+        return False
+
+    day = match.get("utcDate", "")[:10]
+    home = match["homeTeam"]["name"]
+    away = match["awayTeam"]["name"]
+    with state["lock"]:
+        state["match_ids"].add(match.get("id"))
+
+        md = match.get("matchday")
+        if md is not None:
+            state["matchday_dates"][md] = max(state["matchday_dates"].get(md, ""), day)
+
+        if state["results"] and day < state["results"][-1][0]:
+            bisect.insort(state["results"], (day, home, away, gh, ga))
+            _rebuild_from(state, day)
+        else:
+            _add(state, day, home, away, gh, ga)
+    return True
+
+
+def add_results(state, matches):
+    added = 0
+    for m in sorted(matches, key=lambda m: m.get("utcDate", "")):
+        if add_result(state, m):
+            added += 1
+    return added
+
+
+# Teams that had not played yet when a snapshot was taken are listed below it with zero points.
+def _with_unplayed(state, table):
+    missing = sorted(set(state["teams"]) - set(table))
+    if not missing:
+        return table
+    table = dict(table)
+    for pos, name in enumerate(missing, start=len(table) + 1):
+        table[name] = dict(_new_totals(), position=pos, goal_diff=0)
+    return table
+
+
+# The table entering date as_of (an ISO date or timestamp): every result from earlier dates, none from that day on.
+# Without as_of, the latest table. Teams registered but not yet played appear with zero points.
+def standings_as_of(state, as_of=None):
+    with state["lock"]:
+        _flush(state)
+        if as_of is None:
+            idx = len(state["snapshots"]) - 1
+        else:
+            idx = bisect.bisect_left(state["snapshot_dates"], as_of[:10]) - 1
+        return _with_unplayed(state, state["snapshots"][idx] if idx >= 0 else {})
+
+
+# The table after the last match date of a matchday.
+def standings_after_matchday(state, matchday):
+    with state["lock"]:
+        day = state["matchday_dates"].get(matchday)
+        if day is None:
+            return {}
+        _flush(state)
+        idx = bisect.bisect_right(state["snapshot_dates"], day) - 1
+        return _with_unplayed(state, state["snapshots"][idx] if idx >= 0 else {})
+
+
+# Returns a standings function for predict_match: table entering the given date, without any API call.
+def standings_fn(state):
+    def fn(as_of=None):
+        return standings_as_of(state, as_of)
+    return fn
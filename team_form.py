@@ -0,0 +1,182 @@
+import bisect
+import threading
+
+
+# Per-team, per-venue prefix sums of points, results, goals for and goals against.
+# Matches are appended as they finish, and form, attack, defense and momentum can then be read for any
+# window length, exponential half-life or historical date in O(1), without re-walking match lists.
+#
+# For a series of n matches, the plain prefix arrays have n + 1 entries (index 0 is empty), so a window
+# [start, end) sums to P[end] - P[start]. For a half-life h (in matches) with r = 0.5 ** (1 / h), the decayed
+# running sums E[k] = E[k-1] * r + x[k-1] give the weighted window sum E[end] - r ** w * E[start].
+#
+# Updates (including the rebuild after an out-of-order result) and reads share one lock, so a reader on a worker
+# thread never pairs the dates of one version of a series with the sums of another.
+
+FIELDS = ("points", "results", "gf", "ga")
+
+# Same defaults as compute_home_away_stats
+FORM_WINDOW = 20
+MOMENTUM_WINDOW = 5
+
+
+# Creates an empty index. Series are created the first time a team plays at a venue.
+def new_form_index():
+    return {"series": {}, "lock": threading.RLock()}
+
+
+def _new_series():
+    series = {"match_ids": set(), "rows": [], "dates": [], "decay": {}}
+    for f in FIELDS:
+        series[f] = [0]
+    return series
+
+
+def _values(gf, ga):
+    if gf > ga:
+        return {"points": 3, "results": 1.0, "gf": gf, "ga": ga}
+    if gf < ga:
+        return {"points": 0, "results": 0.0, "gf": gf, "ga": ga}
+    return {"points": 1, "results": 0.5, "gf": gf, "ga": ga}
+
+
+def _append(series, date, values):
+    for f in FIELDS:
+        series[f].append(series[f][-1] + values[f])
+    for decayed in series["decay"].values():
+        r = decayed["r"]
+        for f in FIELDS:
+            decayed[f].append(decayed[f][-1] * r + values[f])
+    series["dates"].append(date)
+
+
+# Rebuilds a series from its raw matches; only needed when a result arrives out of date order.
+def _rebuild(series):
+    rebuilt = _new_series()
+    rebuilt["rows"] = series["rows"]
+    for date, values in rebuilt["rows"]:
+        _append(rebuilt, date, values)
+    for h in series["decay"]:
+        _decayed(rebuilt, h)
+    for key in FIELDS + ("decay", "dates"):
+        series[key] = rebuilt[key]
+
+
+def _add(series, match_id, date, values):
+    if match_id in series["match_ids"]:
+        return False
+    series["match_ids"].add(match_id)
+    if series["dates"] and date < series["dates"][-1]:
+        series["rows"].insert(bisect.bisect_right(series["dates"], date), (date, values))
+        _rebuild(series)
+    else:
+        series["rows"].append((date, values))
+        _append(series, date, values)
+    return True
+
+
+# Adds one finished match to the home team's HOME series and the away team's AWAY series.
+# Unfinished and already indexed matches are ignored. Returns True if the index changed.
+def add_match(index, match):
+    score = match.get("score", {}).get("fullTime", {})
+    gh = score.get("home")
+    ga = score.get("away")
+    if gh is None or ga is None:
+        return False
+
+    date = match.get("utcDate", "")
+    home_key = (match["homeTeam"]["id"], "HOME")
+    away_key = (match["awayTeam"]["id"], "AWAY")
+    with index["lock"]:
+        home = index["series"].setdefault(home_key, _new_series())
+        away = index["series"].setdefault(away_key, _new_series())
+
+        added = _add(home, match["id"], date, _values(gh, ga))
+        added = _add(away, match["id"], date, _values(ga, gh)) or added
+    return added
+
+
+# Adds a batch of matches in date order. Returns the number of matches that changed the index.
+def add_matches(index, matches):
+    added = 0
+    with index["lock"]:
+        for m in sorted(matches, key=lambda m: m.get("utcDate", "")):
+            if add_match(index, m):
+                added += 1
+    return added
+
+
+# Returns the decayed running sums for a half-life, building them once in O(n) on first use.
+def _decayed(series, half_life):
+    decayed = series["decay"].get(half_life)
+    if decayed is None:
+        r = 0.5 ** (1 / half_life)
+        decayed = {"r": r}
+        for f in FIELDS:
+            sums = [0.0]
+            prefix = series[f]
+            for k in range(1, len(prefix)):
+                sums.append(sums[-1] * r + (prefix[k] - prefix[k - 1]))
+            decayed[f] = sums
+        series["decay"][half_life] = decayed
+    return decayed
+
+
+# Returns {points, results, gf, ga} summed over matches [start, end), decayed by half_life when given,
+# plus the total weight (the match count when undecayed).
+def _window_sums(series, start, end, half_life=None):
+    if half_life is None:
+        sums = {f: series[f][end] - series[f][start] for f in FIELDS}
+        return sums, end - start
+
+    decayed = _decayed(series, half_life)
+    r = decayed["r"]
+    rw = r ** (end - start)
+    sums = {f: decayed[f][end] - rw * decayed[f][start] for f in FIELDS}
+    weight = (1 - rw) / (1 - r)
+    return sums, weight
+
+
+# Venue stats in the same shape as compute_home_away_stats, read from the index in O(1).
+# window is the number of most recent venue matches used; half_life (in matches) additionally weights them
+# towards the latest; as_of (ISO date) only counts matches played before that date.
+def compute_form_stats(index, team_id, venue, window=FORM_WINDOW, half_life=None, as_of=None,
+                       momentum_window=MOMENTUM_WINDOW):
+    # Also covers the decayed sums, which are built on first use
+    with index["lock"]:
+        return _form_stats(index, team_id, venue, window, half_life, as_of, momentum_window)
+
+
+def _form_stats(index, team_id, venue, window, half_life, as_of, momentum_window):
+    series = index["series"].get((team_id, venue))
+    end = 0
+    if series is not None:
+        end = len(series["dates"]) if as_of is None else bisect.bisect_left(series["dates"], as_of)
+
+    if end == 0:
+        return {
+            "form_index": 0.5,
+            "attack": 1,
+            "defense": 1,
+            "momentum": 0.5
+        }
+
+    start = max(0, end - window)
+    sums, weight = _window_sums(series, start, end, half_life)
+
+    # Momentum is always the plain result average of the last few matches, as in compute_home_away_stats
+    recent = series["results"][end] - series["results"][max(0, end - momentum_window)]
+
+    return {
+        "form_index": round(sums["points"] / (3 * weight), 2),
+        "attack": sums["gf"] / weight,
+        "defense": sums["ga"] / weight,
+        "momentum": round(recent / momentum_window, 2)
+    }
+
+
+# Returns a stats function for predict_match backed by this index, replacing the per-team venue fetches.
+def form_stats_fn(index, window=FORM_WINDOW, half_life=None, as_of=None):
+    def stats_fn(team_id, venue):
+        return compute_form_stats(index, team_id, venue, window, half_life, as_of)
+    return stats_fn
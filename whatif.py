@@ -0,0 +1,263 @@
+import argparse
+import json
+
+import numpy as np
+
+import footballpredictions as fp
+from calibration import apply_calibration, load_calibrations
+from query import iter_predictions
+from vector_model import (
+    DEFAULT_PARAMS, stats_rating, tier_bonus, apply_rivalry, table_bias, congestion_adjustment, ratings_to_probs
+)
+
+
+# What-if re-scoring of stored predictions from their saved input features, without any API call.
+# Tiers and rivalries come from a config (the current one in footballpredictions.py unless changed), and any input of
+# a single fixture can be overridden; every selected fixture is then scored in one vectorised pass.
+# Fixtures saved with a calibration (they keep their raw probabilities in details) are calibrated with their
+# competition's stored model, so an unchanged config reproduces the stored probabilities. If that model is no longer
+# stored, they are compared at their raw probabilities instead.
+
+_FEATURE_COLUMNS = ("match_id", "date", "competition", "matchday", "home_team", "away_team",
+                    "home_prob", "draw_prob", "away_prob", "features", "details")
+
+STAT_NAMES = ("form_index", "attack", "defense", "momentum")
+
+# Inputs that can be overridden per fixture, e.g. {match_id: {"home_tier": "BIG", "away_pos": 4}}
+OVERRIDE_KEYS = (
+    "home_tier", "away_tier", "rivalry", "home_pos", "away_pos", "home_h2h_wins", "away_h2h_wins",
+    "home_base", "away_base", "home_rest_days", "away_rest_days", "home_recent_matches", "away_recent_matches",
+) + tuple(f"{side}_{name}" for side in ("home", "away") for name in STAT_NAMES)
+
+
+def current_config():
+    return {"BIG_TEAMS": fp.BIG_TEAMS, "MID_TEAMS": fp.MID_TEAMS, "LOW_TEAMS": fp.LOW_TEAMS,
+            "RIVALRIES": fp.RIVALRIES}
+
+
+# Same classification as team_tier_bonus.
+def team_tier(name, config):
+    if name in config["BIG_TEAMS"]:
+        return "BIG"
+    if name in config["MID_TEAMS"]:
+        return "MID"
+    if name in config["LOW_TEAMS"]:
+        return "LOW"
+    return "UNKNOWN"
+
+
+# Stored predictions that have features, selected with the same filters as query.py. raw_probs holds the
+# probabilities before calibration, or None if the prediction was not calibrated.
+def load_fixtures(conn, **filters):
+    rows = []
+    for row in iter_predictions(conn, page_size=1000, columns=_FEATURE_COLUMNS, **filters):
+        if row["features"]:
+            row["features"] = json.loads(row["features"])
+            details = row.pop("details")
+            row["raw_probs"] = json.loads(details).get("raw_probs") if details else None
+            rows.append(row)
+    return rows
+
+
+def _competition(row):
+    return row.get("competition") or "LEAGUE"
+
+
+# True if the fixture was saved calibrated and its competition's model is in calibrations.
+def is_calibrated(row, calibrations):
+    return row.get("raw_probs") is not None and _competition(row) in calibrations
+
+
+# Calibrates the probabilities of the fixtures that were saved calibrated, with their competition's model in
+# calibrations ({competition: model}, as from calibration.load_calibrations). The arrays may have extra leading axes
+# (e.g. one per model); the last one runs over rows.
+def calibrate(rows, p_home, p_draw, p_away, calibrations):
+    p_home, p_draw, p_away = (np.array(p, dtype=float) for p in (p_home, p_draw, p_away))
+    for comp, model in calibrations.items():
+        mask = np.array([row.get("raw_probs") is not None and _competition(row) == comp for row in rows], dtype=bool)
+        if mask.any():
+            p_home[..., mask], p_draw[..., mask], p_away[..., mask] = apply_calibration(
+                model, p_home[..., mask], p_draw[..., mask], p_away[..., mask])
+    return p_home, p_draw, p_away
+
+
+# The stored probabilities a calibrated what-if is compared with: as saved, or the raw ones when the fixture was
+# saved calibrated but its competition's model is no longer stored.
+def stored_probs(row, calibrations):
+    raw = row.get("raw_probs")
+    if raw is not None and not is_calibrated(row, calibrations):
+        return round(raw["home"], 4), round(raw["draw"], 4), round(raw["away"], 4)
+    return row["home_prob"], row["draw_prob"], row["away_prob"]
+
+
+# Flattens the features of every fixture into one dict of inputs, applies the overrides and stacks each input
+# into an array.
+def feature_arrays(rows, config, overrides=None):
+    overrides = overrides or {}
+    inputs = []
+    for row in rows:
+        f = row["features"]
+        x = {
+            "home_tier": team_tier(row["home_team"], config),
+            "away_tier": team_tier(row["away_team"], config),
+            "rivalry": row["away_team"] in config["RIVALRIES"].get(row["home_team"], ()),
+            "home_pos": f["table"]["home_pos"],
+            "away_pos": f["table"]["away_pos"],
+            "home_h2h_wins": f["h2h"]["home_wins"],
+            "away_h2h_wins": f["h2h"]["away_wins"],
+            "home_base": f["base"]["home"] if f["base"] else None,
+            "away_base": f["base"]["away"] if f["base"] else None,
+        }
+        # Only predicted with a schedule index; without it there is no congestion adjustment
+        congestion = f.get("congestion") or {}
+        for key in ("home_rest_days", "away_rest_days", "home_recent_matches", "away_recent_matches"):
+            x[key] = congestion.get(key)
+        for side in ("home", "away"):
+            stats = f[f"{side}_stats"] or {}
+            for name in STAT_NAMES:
+                x[f"{side}_{name}"] = stats.get(name)
+        for key, value in overrides.get(row["match_id"], {}).items():
+            if key not in OVERRIDE_KEYS:
+                raise ValueError(f"Unknown override {key!r}; expected one of {OVERRIDE_KEYS}")
+            x[key] = value
+        inputs.append(x)
+
+    arrays = {}
+    for key in OVERRIDE_KEYS:
+        values = [x[key] for x in inputs]
+        if key.endswith("_tier"):
+            arrays[key] = np.array(values, dtype=object)
+        else:
+            arrays[key] = np.array([np.nan if v is None else v for v in values], dtype=float)
+    return arrays
+
+
+# Scores the fixtures through the same steps as predict_match: base rating (venue stats, or the stored base
+# from a rating model), tier, rivalry underdog, H2H, table bias and congestion, then probabilities.
+# Returns (p_home, p_draw, p_away) arrays.
+def score(arrays, params=None):
+    home = stats_rating(*(arrays[f"home_{n}"] for n in STAT_NAMES), is_home=True, params=params)
+    away = stats_rating(*(arrays[f"away_{n}"] for n in STAT_NAMES), is_home=False, params=params)
+    home = np.where(np.isnan(arrays["home_base"]), home, arrays["home_base"])
+    away = np.where(np.isnan(arrays["away_base"]), away, arrays["away_base"])
+
+    home = home + tier_bonus(arrays["home_tier"], params)
+    away = away + tier_bonus(arrays["away_tier"], params)
+
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    rivalry = arrays["rivalry"] > 0
+    home, away = apply_rivalry(home, away, np.where(rivalry, p["rivalry_underdog"], 0.0))
+    draw_boost = np.where(rivalry, p["rivalry_draw_boost"], 0.0)
+
+    net_wins = arrays["home_h2h_wins"] - arrays["away_h2h_wins"]
+    home = home + net_wins * p["h2h_per_win"]
+    away = away - net_wins * p["h2h_per_win"]
+
+    home_table, away_table = table_bias(arrays["home_pos"], arrays["away_pos"], params)
+    home = home + home_table + congestion_adjustment(arrays["home_rest_days"], arrays["home_recent_matches"], params)
+    away = away + away_table + congestion_adjustment(arrays["away_rest_days"], arrays["away_recent_matches"], params)
+    return ratings_to_probs(home, away, draw_boost, params)
+
+
+# Re-scores the given fixtures (from load_fixtures) under a config and per-fixture overrides.
+# config holds any of BIG_TEAMS, MID_TEAMS, LOW_TEAMS and RIVALRIES, replacing the current values; calibrations
+# are the stored calibration models ({competition: model}).
+# Returns one dict per fixture with the stored and what-if probabilities and most likely outcomes.
+def rescore(rows, config=None, overrides=None, params=None, calibrations=None):
+    if not rows:
+        return []
+    config = dict(current_config(), **(config or {}))
+    calibrations = calibrations or {}
+    p_home, p_draw, p_away = calibrate(rows, *score(feature_arrays(rows, config, overrides), params), calibrations)
+
+    results = []
+    for i, row in enumerate(rows):
+        stored = stored_probs(row, calibrations)
+        whatif = (round(float(p_home[i]), 4), round(float(p_draw[i]), 4), round(float(p_away[i]), 4))
+        results.append({
+            "match_id": row["match_id"],
+            "date": row["date"],
+            "home_team": row["home_team"],
+            "away_team": row["away_team"],
+            "stored": dict(zip(("home", "draw", "away"), stored)),
+            "whatif": dict(zip(("home", "draw", "away"), whatif)),
+            "stored_outcome": fp.predicted_outcome(*stored),
+            "whatif_outcome": fp.predicted_outcome(*whatif)
+        })
+    return results
+
+
+# Parses "MATCH_ID:key=value" into an overrides dict entry; numbers and true/false are converted.
+def parse_override(text, overrides):
+    match_id, _, assignment = text.partition(":")
+    key, _, value = assignment.partition("=")
+    if not match_id.isdigit() or not key or not value:
+        raise ValueError(f"Expected MATCH_ID:key=value, got {text!r}")
+    if value.lower() in ("true", "false"):
+        value = value.lower() == "true"
+    elif key.endswith("_tier"):
+        value = value.upper()
+    else:
+        value = float(value)
+    overrides.setdefault(int(match_id), {})[key] = value
+
+
+def format_result(r):
+    s = r["stored"]
+    w = r["whatif"]
+    change = "" if r["whatif_outcome"] == r["stored_outcome"] else f"  {r['stored_outcome']} → {r['whatif_outcome']}"
+    return (f"{r['date'][:10]} {r['home_team']} vs {r['away_team']} | "
+            f"{s['home']*100:5.1f}/{s['draw']*100:5.1f}/{s['away']*100:5.1f} → "
+            f"{w['home']*100:5.1f}/{w['draw']*100:5.1f}/{w['away']*100:5.1f} "
+            f"(home {(w['home'] - s['home'])*100:+.1f}){change}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored predictions under a changed config, offline.")
+    parser.add_argument("--db", default=fp.DB_PATH)
+    parser.add_argument("--team")
+    parser.add_argument("--competition")
+    parser.add_argument("--matchday", type=int)
+    parser.add_argument("--date-from", help="YYYY-MM-DD")
+    parser.add_argument("--date-to", help="YYYY-MM-DD (inclusive)")
+    for tier in ("big", "mid", "low"):
+        parser.add_argument(f"--{tier}", action="append", default=[], metavar="TEAM",
+                            help=f"move a team to {tier.upper()}_TEAMS")
+    parser.add_argument("--rivalry", action="append", default=[], metavar="HOME:AWAY", help="add a rivalry")
+    parser.add_argument("--set", action="append", default=[], metavar="MATCH_ID:key=value",
+                        help=f"override one input of a fixture; keys: {', '.join(OVERRIDE_KEYS)}")
+    parser.add_argument("--changed-only", action="store_true", help="only fixtures whose most likely outcome changes")
+    parser.add_argument("--json", action="store_true", help="one JSON object per line")
+    args = parser.parse_args()
+
+    config = {name: set(teams) for name, teams in current_config().items() if name != "RIVALRIES"}
+    for tier in ("big", "mid", "low"):
+        for team in getattr(args, tier):
+            for name in ("BIG_TEAMS", "MID_TEAMS", "LOW_TEAMS"):
+                config[name].discard(team)
+            config[f"{tier.upper()}_TEAMS"].add(team)
+    config["RIVALRIES"] = {home: set(aways) for home, aways in fp.RIVALRIES.items()}
+    for pair in args.rivalry:
+        home, _, away = pair.partition(":")
+        config["RIVALRIES"].setdefault(home, set()).add(away)
+
+    overrides = {}
+    for text in args.set:
+        parse_override(text, overrides)
+
+    conn = fp.init_db(args.db)
+    rows = load_fixtures(conn, team=args.team, competition=args.competition, matchday=args.matchday,
+                         date_from=args.date_from, date_to=args.date_to)
+    calibrations = load_calibrations(conn)
+    conn.close()
+
+    results = rescore(rows, config, overrides, calibrations=calibrations)
+    changed = 0
+    for r in results:
+        if r["whatif_outcome"] != r["stored_outcome"]:
+            changed += 1
+        elif args.changed_only:
+            continue
+        print(json.dumps(r) if args.json else format_result(r))
+    if not args.json:
+        print(f"\n{len(results)} fixtures re-scored, most likely outcome changed for {changed}.")